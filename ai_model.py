@@ -1,8 +1,43 @@
+import json
 import os
+import time
 import requests
+from local_llm import LocalLLM
+from metrics import AI_QUEUE_DEPTH, AI_QUEUE_WAIT, add_timing, timed_ai
+from resilience import (AIMDLimiter, CircuitBreaker, FairScheduler, Hedger,
+                        QueueTimeoutError)
+
+FALLBACK_INTERPRETATION = "Unable to interpret this dream right now. Please try again."
+FALLBACK_EMOTION = {
+    "primary": "neutral", "secondary": "neutral",
+    "confidence_primary": 0.0, "confidence_secondary": 0.0,
+    "all": []
+}
+
+INTERPRET_PROMPT = (
+    "You are Somnia, a wise and mystical dream analyst. Interpret dreams with "
+    "psychological depth, emotional insight, and symbolic meaning. Be thoughtful, "
+    "poetic, and positive. Always respond in 2-3 sentences only."
+)
+SYMBOLS_PROMPT = (
+    "You are a dream symbol extractor. "
+    "Given a dream description, return ONLY a JSON array of "
+    "3-6 short symbol labels (1-3 words each) representing the key "
+    "archetypes or themes present (e.g. \"water\", \"falling\", "
+    "\"unknown figure\", \"flying\", \"dark forest\"). "
+    "No explanation, no markdown, just the raw JSON array."
+)
+COMBINED_PROMPT = (
+    INTERPRET_PROMPT + " Reply with ONLY a JSON object of the form "
+    "{\"interpretation\": \"<your 2-3 sentences>\", \"symbols\": [...]} where "
+    "symbols is a list of 3-6 short labels (1-3 words each) for the key "
+    "archetypes or themes in the dream. No markdown."
+)
 
 
 class DreamAI:
+    # Scheduler priority tiers: new submissions go ahead of edits
+    TIERS = ("submit", "reanalyze")
     HF_CHAT_URL = "https://router.huggingface.co/v1/chat/completions"
     HF_CLASS_URL = "https://router.huggingface.co/hf-inference/models/SamLowe/roberta-base-go_emotions"
 
@@ -12,51 +47,179 @@ class DreamAI:
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json"
         }
+        # Point at a different router (e.g. a local stand-in for benchmarks)
+        router = os.getenv("HF_ROUTER_URL", "").rstrip("/")
+        if router:
+            self.HF_CHAT_URL = router + "/v1/chat/completions"
+            self.HF_CLASS_URL = router + "/hf-inference/models/SamLowe/roberta-base-go_emotions"
+        self.timeout = float(os.getenv("HF_TIMEOUT", "60"))
+        self.breakers = {
+            url: CircuitBreaker(name, slow_call=self.timeout / 2)
+            for name, url in (("chat", self.HF_CHAT_URL), ("classify", self.HF_CLASS_URL))
+        }
+        # Raise these under gevent workers, where one process holds many requests
+        initial = int(os.getenv("HF_CONCURRENCY_INITIAL", "8"))
+        max_limit = int(os.getenv("HF_CONCURRENCY_MAX", "64"))
+        self.limiters = {
+            url: AIMDLimiter(name, initial=initial, max_limit=max_limit,
+                             target_latency=self.timeout / 4)
+            for name, url in (("chat", self.HF_CHAT_URL), ("classify", self.HF_CLASS_URL))
+        }
+        # Optional tail-latency hedging for interpret(); off unless HF_HEDGE is set
+        self.hedger = None
+        if os.getenv("HF_HEDGE", "").lower() in ("1", "true", "yes"):
+            self.hedger = Hedger(
+                "interpret",
+                percentile=float(os.getenv("HF_HEDGE_PERCENTILE", "95")),
+                budget=float(os.getenv("HF_HEDGE_BUDGET", "0.05")),
+            )
+        # One HF_TOKEN is shared by everyone: split its quota fairly per user.
+        # Per process — divide the provider's limit by the number of workers.
+        # Fair sharing needs the gevent worker (gunicorn.conf.py's default);
+        # sync workers and Vercel only get the quota pacing.
+        self.scheduler = FairScheduler(
+            "hf",
+            rate=float(os.getenv("AI_QUOTA_RPS", "5")),
+            burst=float(os.getenv("AI_QUOTA_BURST", "15")),
+            per_key=int(os.getenv("AI_QUEUE_PER_USER", "3")),
+            timeout=float(os.getenv("AI_QUEUE_TIMEOUT", "30")),
+            tiers=self.TIERS,
+        )
+        # Optional llama.cpp model on CPU, as fallback for or instead of HF chat
+        self.local = LocalLLM.from_env()
+        self.local_mode = os.getenv("LOCAL_LLM_MODE", "fallback") if self.local else "off"
 
-    def interpret(self, dream_text: str) -> str:
+    def _post(self, url: str, payload: dict) -> dict:
+        """POST to an HF endpoint behind its circuit breaker and concurrency limit.
+
+        Raises CircuitOpenError / ConcurrencyLimitError without touching the
+        network when the endpoint is unhealthy or saturated, so callers fall
+        straight through to their fallback.
+        """
+        breaker = self.breakers[url]
+        limiter = self.limiters[url]
+        breaker.before_call()
         try:
-            res = requests.post(
-                self.HF_CHAT_URL,
-                headers=self.headers,
-                json={
-                    "model": "Qwen/Qwen2.5-7B-Instruct",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are Somnia, a wise and mystical dream analyst. Interpret dreams with psychological depth, emotional insight, and symbolic meaning. Be thoughtful, poetic, and positive. Always respond in 2-3 sentences only."
-                        },
-                        {
-                            "role": "user",
-                            "content": f"Interpret this dream: {dream_text}"
-                        }
-                    ],
-                    "max_tokens": 200,
-                    "temperature": 0.7
-                },
-                timeout=60,
-            )
+            limiter.acquire()
+        except Exception:
+            breaker.cancel()
+            raise
+        start = time.monotonic()
+        ok = False
+        try:
+            res = requests.post(url, headers=self.headers, json=payload,
+                                timeout=self.timeout)
             res.raise_for_status()
             data = res.json()
+            ok = True
+            return data
+        finally:
+            latency = time.monotonic() - start
+            limiter.release(ok, latency)
+            breaker.record(ok, latency)
+
+    def _hedged_post(self, url: str, payload: dict) -> dict:
+        if self.hedger is None:
+            return self._post(url, payload)
+        # A hedge is one more HF call: it takes a quota token the caller's
+        # fair-share slot didn't pay for, or isn't sent
+        return self.hedger.call(lambda: self._post(url, payload),
+                                admit=lambda: self.scheduler.bucket.try_take())
+
+    def status(self) -> dict:
+        """Circuit breaker, concurrency limiter and hedging state per endpoint."""
+        status = {
+            self.breakers[url].name: {
+                **self.breakers[url].snapshot(),
+                "limiter": self.limiters[url].snapshot(),
+            }
+            for url in self.breakers
+        }
+        if self.hedger is not None:
+            status["hedging"] = self.hedger.snapshot()
+        status["scheduler"] = self.scheduler.snapshot()
+        if self.local is not None:
+            status["local_llm"] = {"mode": self.local_mode, **self.local.stats()}
+        return status
+
+    def analyze(self, dream_text: str, user_id, tier: str = "submit"):
+        """Return (interpretation, emotion, symbols), waiting for the user's fair turn.
+
+        Costs one quota token per HF call; a hedge takes one more when it is
+        sent. Raises QueueFullError if the user already has AI_QUEUE_PER_USER
+        analyses pending; if their turn doesn't come within AI_QUEUE_TIMEOUT,
+        returns the same fallbacks as an outage.
+        """
+        local_first = self.local_mode == "primary"
+        depth = AI_QUEUE_DEPTH.labels(tier)
+        depth.inc()
+        queued = True
+        try:
+            # With the local model in front only the emotion classifier is remote
+            with self.scheduler.slot(user_id, tier, cost=1 if local_first else 3) as waited:
+                depth.dec()
+                queued = False
+                AI_QUEUE_WAIT.labels(tier).observe(waited)
+                add_timing("ai.queue", waited)
+                if local_first:
+                    interpretation, symbols = self.interpret_and_extract(dream_text)
+                else:
+                    interpretation = self.interpret(dream_text)
+                    symbols = self.extract_symbols(dream_text)
+                return interpretation, self.analyze_emotion(dream_text), symbols
+        except QueueTimeoutError as e:
+            print("AI queue timeout:", e)
+            return FALLBACK_INTERPRETATION, dict(FALLBACK_EMOTION), []
+        finally:
+            if queued:
+                depth.dec()
+
+    def _chat(self, messages: list, max_tokens: int, temperature: float,
+              hedged: bool = False) -> str:
+        """Chat completion from the configured backend(s).
+
+        LOCAL_LLM_MODE=primary tries the local model first and the HF router
+        if it fails; "fallback" does the reverse.
+        """
+        if self.local_mode == "primary":
+            try:
+                return self.local.chat(messages, max_tokens, temperature)
+            except Exception as e:
+                print("Local LLM error, using HF:", e)
+        try:
+            post = self._hedged_post if hedged else self._post
+            data = post(self.HF_CHAT_URL, {
+                "model": "Qwen/Qwen2.5-7B-Instruct",
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+            })
             return data["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            if self.local_mode != "fallback":
+                raise
+            print("HF chat error, using local LLM:", e)
+            return self.local.chat(messages, max_tokens, temperature)
+
+    @timed_ai
+    def interpret(self, dream_text: str) -> str:
+        try:
+            return self._chat(
+                [
+                    {"role": "system", "content": INTERPRET_PROMPT},
+                    {"role": "user", "content": f"Interpret this dream: {dream_text}"},
+                ],
+                max_tokens=200, temperature=0.7, hedged=True,
+            )
         except Exception as e:
             print("Interpretation error:", e)
-            return "Unable to interpret this dream right now. Please try again."
+            return FALLBACK_INTERPRETATION
 
+    @timed_ai
     def analyze_emotion(self, dream_text: str) -> dict:
-        fallback = {
-            "primary": "neutral", "secondary": "neutral",
-            "confidence_primary": 0.0, "confidence_secondary": 0.0,
-            "all": []
-        }
+        fallback = dict(FALLBACK_EMOTION)
         try:
-            res = requests.post(
-                self.HF_CLASS_URL,
-                headers=self.headers,
-                json={"inputs": dream_text},
-                timeout=60,
-            )
-            res.raise_for_status()
-            data = res.json()
+            data = self._post(self.HF_CLASS_URL, {"inputs": dream_text})
 
             if not isinstance(data, list) or not data:
                 return fallback
@@ -74,41 +237,55 @@ class DreamAI:
             print("Emotion error:", e)
             return fallback
 
+    @timed_ai
     def extract_symbols(self, dream_text: str) -> list:
         """Extract recurring dream symbols/themes as a list of short labels."""
         try:
-            res = requests.post(
-                self.HF_CHAT_URL,
-                headers=self.headers,
-                json={
-                    "model": "Qwen/Qwen2.5-7B-Instruct",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": (
-                                "You are a dream symbol extractor. "
-                                "Given a dream description, return ONLY a JSON array of "
-                                "3-6 short symbol labels (1-3 words each) representing the key "
-                                "archetypes or themes present (e.g. \"water\", \"falling\", "
-                                "\"unknown figure\", \"flying\", \"dark forest\"). "
-                                "No explanation, no markdown, just the raw JSON array."
-                            )
-                        },
-                        {"role": "user", "content": dream_text}
-                    ],
-                    "max_tokens": 80,
-                    "temperature": 0.3
-                },
-                timeout=60,
+            raw = self._chat(
+                [
+                    {"role": "system", "content": SYMBOLS_PROMPT},
+                    {"role": "user", "content": dream_text},
+                ],
+                max_tokens=80, temperature=0.3,
             )
-            res.raise_for_status()
-            raw = res.json()["choices"][0]["message"]["content"].strip()
-            # Strip any accidental markdown fences
-            raw = raw.replace("```json", "").replace("```", "").strip()
-            import json
-            symbols = json.loads(raw)
+            symbols = json.loads(_strip_fences(raw))
             if isinstance(symbols, list):
-                return [str(s).strip().lower() for s in symbols if s][:6]
+                return _clean_symbols(symbols)
         except Exception as e:
             print("Symbol extraction error:", e)
         return []
+
+    @timed_ai
+    def interpret_and_extract(self, dream_text: str):
+        """Interpretation and symbols from one local-model prompt.
+
+        The local model handles one sequence at a time, so asking for both
+        in one generation evaluates the dream text once instead of twice.
+        Falls back to separate calls if the reply isn't the expected JSON.
+        """
+        try:
+            raw = self.local.chat(
+                [
+                    {"role": "system", "content": COMBINED_PROMPT},
+                    {"role": "user", "content": dream_text},
+                ],
+                max_tokens=280, temperature=0.5,
+            )
+            raw = _strip_fences(raw)
+            data = json.loads(raw[raw.index("{"):raw.rindex("}") + 1])
+            interpretation = str(data["interpretation"]).strip()
+            symbols = data.get("symbols")
+            if interpretation and isinstance(symbols, list):
+                return interpretation, _clean_symbols(symbols)
+        except Exception as e:
+            print("Combined local analysis error:", e)
+        return self.interpret(dream_text), self.extract_symbols(dream_text)
+
+
+def _strip_fences(raw: str) -> str:
+    # Strip any accidental markdown fences
+    return raw.replace("```json", "").replace("```", "").strip()
+
+
+def _clean_symbols(symbols: list) -> list:
+    return [str(s).strip().lower() for s in symbols if s][:6]
@@ -1,27 +1,121 @@
 import os
 import secrets
+import threading
+import time
 from flask import (Flask, render_template, request, redirect,
-                   url_for, session, flash, jsonify)
+                   url_for, session, flash, jsonify, g, Response, abort,
+                   send_from_directory)
 from dotenv import load_dotenv
 from datetime import datetime
-import requests as http_requests
-import database as db
-from ai_model import DreamAI
+from werkzeug.middleware.proxy_fix import ProxyFix
 
+# Before the local imports: several modules read their settings at import time
 load_dotenv()
 
+import assets
+import database as db
+import metrics
+import profiler
+import purger
+from passwords import HashPoolBusy
+from resilience import KeyedRateLimiter, QueueFullError
+
+# Heavier modules (insights -> numpy, oauth/ai_model -> requests) are imported
+# inside the routes that need them so serverless cold starts don't pay for them.
+
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "dev-secret-change-me")
-
-ai = DreamAI()
+# Heroku's router and Vercel's edge each append one X-Forwarded-For hop; without
+# this remote_addr is the proxy and every client shares one rate-limit bucket.
+# Set PROXY_HOPS=0 when clients connect directly, or the header can be forged.
+PROXY_HOPS = int(os.getenv("PROXY_HOPS", "1"))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS, x_proto=PROXY_HOPS)
+assets.init_app(app)
+
+_ai = None
+_ai_lock = threading.Lock()
+
+
+def get_ai():
+    """The shared DreamAI client, built on first use."""
+    global _ai
+    if _ai is None:
+        with _ai_lock:
+            if _ai is None:
+                from ai_model import DreamAI
+                _ai = DreamAI()
+    return _ai
+
+# Auth throttling: checked before any password hash is computed
+ip_limiter = KeyedRateLimiter(
+    float(os.getenv("AUTH_RATE_PER_IP", "20")) / 60,
+    capacity=int(os.getenv("AUTH_BURST_PER_IP", "10")),
+)
+username_limiter = KeyedRateLimiter(
+    float(os.getenv("AUTH_RATE_PER_USERNAME", "5")) / 60,
+    capacity=int(os.getenv("AUTH_BURST_PER_USERNAME", "5")),
+)
+
+
+# ── Instrumentation ────────────────────────────────────────────────────────────
+# Server-Timing names internal endpoints and DB helpers, so it only goes to
+# admins unless SERVER_TIMING_PUBLIC is set (e.g. for a load test). Static
+# assets skip the admin check: reading the session would add Vary: Cookie.
+SERVER_TIMING_PUBLIC = os.getenv("SERVER_TIMING_PUBLIC", "").lower() in ("1", "true", "yes")
 
 
-# ── Init DB lazily (safe for Vercel serverless) ────────────────────────────────
 @app.before_request
-def initialize_database():
-    if not getattr(app, '_db_initialized', False):
-        db.init_db()
-        app._db_initialized = True
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc()
+    g.in_flight_counted = True
+    # Admins can force a profile with "X-Profile: 1"; PROFILE_THRESHOLD_MS
+    # profiles everything and keeps only slow requests.
+    forced = bool(request.headers.get("X-Profile")) and session.get("is_admin", False)
+    if forced or profiler.THRESHOLD:
+        profiler.start(request.endpoint or "unknown", forced=forced)
+
+
+@app.after_request
+def record_request_timing(response):
+    start = g.get("request_start")
+    if start is not None:
+        total = time.perf_counter() - start
+        metrics.HTTP_LATENCY.labels(
+            request.endpoint or "unknown", request.method, response.status_code
+        ).observe(total)
+        if SERVER_TIMING_PUBLIC or (request.endpoint not in ("static", "assets")
+                                    and session.get("is_admin")):
+            response.headers["Server-Timing"] = metrics.server_timing_header(total)
+    if profiler.current() is not None:
+        stem = profiler.finish(response.status_code)
+        if stem:
+            response.headers["X-Profile-Id"] = stem
+    return response
+
+
+@app.teardown_request
+def finish_request(exc=None):
+    if g.pop("in_flight_counted", False):
+        metrics.HTTP_IN_FLIGHT.dec()
+    if profiler.current() is not None:
+        profiler.finish(500)
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint, for "Authorization: Bearer $METRICS_TOKEN".
+
+    Without METRICS_TOKEN it is switched off and answers 404 like any
+    unknown path.
+    """
+    token = os.getenv("METRICS_TOKEN")
+    if not token or not secrets.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(404)
+    body, content_type = metrics.render_latest()
+    return Response(body, mimetype=content_type)
 
 
 # ── Auth helpers ───────────────────────────────────────────────────────────────
@@ -59,12 +153,20 @@ def register():
         password = request.form["password"].strip()
         if not username or not password:
             flash("Username and password are required.", "error")
-        elif db.get_user(username):
-            flash("Username already taken.", "error")
+        elif not ip_limiter.allow(request.remote_addr):
+            flash("Too many attempts. Please wait a minute and try again.", "error")
+            return render_template("register.html"), 429
         else:
-            db.create_user(username, password)
-            flash("Account created! Please log in.", "success")
-            return redirect(url_for("login"))
+            try:
+                created = db.create_user(username, password)
+            except HashPoolBusy:
+                flash("The server is busy. Please try again shortly.", "error")
+                return render_template("register.html"), 503
+            if not created:
+                flash("Username already taken.", "error")
+            else:
+                flash("Account created! Please log in.", "success")
+                return redirect(url_for("login"))
     return render_template("register.html")
 
 
@@ -75,7 +177,15 @@ def login():
     if request.method == "POST":
         username = request.form["username"].strip()
         password = request.form["password"].strip()
-        user = db.verify_password(username, password)
+        if not (ip_limiter.allow(request.remote_addr)
+                and username_limiter.allow(username.lower())):
+            flash("Too many login attempts. Please wait a minute and try again.", "error")
+            return render_template("login.html"), 429
+        try:
+            user = db.verify_password(username, password)
+        except HashPoolBusy:
+            flash("The server is busy. Please try again shortly.", "error")
+            return render_template("login.html"), 503
         if user:
             if user.get("is_blocked"):
                 flash("Your account has been suspended. Contact support.", "error")
@@ -83,6 +193,7 @@ def login():
             session["user_id"] = user["id"]
             session["username"] = user["username"]
             session["is_admin"] = bool(user.get("is_admin"))
+            session["timezone"] = user.get("timezone") or "UTC"
             return redirect(url_for("index"))
         flash("Invalid username or password.", "error")
     return render_template("login.html")
@@ -105,9 +216,12 @@ def index():
             flash("Please enter your dream.", "error")
             return redirect(url_for("index"))
 
-        interpretation = ai.interpret(dream_text)
-        emotion = ai.analyze_emotion(dream_text)
-        symbols = ai.extract_symbols(dream_text)
+        try:
+            interpretation, emotion, symbols = get_ai().analyze(
+                dream_text, session["user_id"], tier="submit")
+        except QueueFullError:
+            flash("Your earlier dreams are still being analyzed. Please wait a moment.", "error")
+            return redirect(url_for("index"))
 
         try:
             sleep_quality = int(request.form.get("sleep_quality", 0)) or None
@@ -125,6 +239,12 @@ def index():
             sleep_quality=sleep_quality,
             symbols=symbols,
         )
+        if dream_id is None:
+            # Deleted accounts wait in the table for the purger; the per-user
+            # helpers skip them, so a session that outlived the delete ends here.
+            session.clear()
+            flash("This account no longer exists.", "error")
+            return redirect(url_for("login"))
         result = {
             "id": dream_id,
             "text": dream_text,
@@ -137,8 +257,7 @@ def index():
     import json
     recent_dreams = db.get_dreams(session["user_id"], limit=4)
     top_symbols   = db.get_top_symbols(session["user_id"], limit=3)
-    all_dreams    = db.get_dreams(session["user_id"], limit=90)
-    dream_dates   = list({str(d["created_at"].date()) for d in all_dreams if d["created_at"]})
+    dream_dates   = [str(day) for day in db.get_dream_days(session["user_id"], limit=90)]
     dream_dates_json = json.dumps(dream_dates)
 
     return render_template(
@@ -154,8 +273,8 @@ def index():
 @login_required
 def history():
     dreams = db.get_dreams(session["user_id"])
-    streak = db.get_streak(session["user_id"])
-    return render_template("history.html", dreams=dreams, streak=streak)
+    streaks = db.get_streaks(session["user_id"])
+    return render_template("history.html", dreams=dreams, streak=streaks["current"])
 
 
 @app.route("/edit/<int:dream_id>", methods=["GET", "POST"])
@@ -172,19 +291,24 @@ def edit_dream(dream_id):
             flash("Dream text cannot be empty.", "error")
             return redirect(url_for("edit_dream", dream_id=dream_id))
 
-        interpretation = ai.interpret(text)
-        emotion = ai.analyze_emotion(text)
-        symbols = ai.extract_symbols(text)
+        try:
+            interpretation, emotion, symbols = get_ai().analyze(
+                text, session["user_id"], tier="reanalyze")
+        except QueueFullError:
+            flash("Your earlier dreams are still being analyzed. Please wait a moment.", "error")
+            return redirect(url_for("edit_dream", dream_id=dream_id))
         try:
             sleep_quality = int(request.form.get("sleep_quality", 0)) or None
         except (ValueError, TypeError):
             sleep_quality = None
-        db.update_dream(
+        if not db.update_dream(
             dream_id, session["user_id"], text, interpretation,
             emotion["primary"], emotion["secondary"],
             emotion["confidence_primary"], emotion["confidence_secondary"],
             sleep_quality=sleep_quality, symbols=symbols,
-        )
+        ):
+            flash("Dream not found.", "error")
+            return redirect(url_for("history"))
         flash("Dream updated!", "success")
         return redirect(url_for("history"))
 
@@ -194,7 +318,10 @@ def edit_dream(dream_id):
 @app.route("/delete/<int:dream_id>", methods=["POST"])
 @login_required
 def delete_dream(dream_id):
-    db.delete_dream(dream_id, session["user_id"])
+    if not db.delete_dream(dream_id, session["user_id"]):
+        flash("Dream not found.", "error")
+        return redirect(url_for("history"))
+    purger.wake()
     flash("Dream deleted.", "success")
     return redirect(url_for("history"))
 
@@ -204,9 +331,10 @@ def delete_dream(dream_id):
 def analytics():
     dreams = db.get_dreams(session["user_id"])
     emotion_counts = db.get_emotion_counts(session["user_id"])
-    streak = db.get_streak(session["user_id"])
+    streaks = db.get_streaks(session["user_id"])
     mood_calendar = db.get_mood_calendar(session["user_id"])
-    sleep_data = db.get_sleep_emotion_data(session["user_id"])
+    import insights
+    stats = insights.get_insights(session["user_id"])
     top_symbols = db.get_top_symbols(session["user_id"])
     total = len(dreams)
 
@@ -225,35 +353,65 @@ def analytics():
         dominant, personality_map["neutral"]
     )
 
-    # Sleep-emotion correlation: avg sleep per emotion
-    sleep_by_emotion = {}
-    for row in sleep_data:
-        e = row["emotion_primary"] or "neutral"
-        sleep_by_emotion.setdefault(e, []).append(row["sleep_quality"])
+    # Sleep-emotion correlation over the full history: avg sleep per emotion
     sleep_emotion_avg = {
-        e: round(sum(v) / len(v), 1)
-        for e, v in sleep_by_emotion.items()
+        e: row["mean"] for e, row in stats["sleep_by_emotion"].items()
     }
 
-    # Mood calendar: convert to {date_str: emotion}
+    # Mood calendar: convert to {date_str: dominant emotion}
     mood_map = {str(r["day"]): r["emotion"] for r in mood_calendar}
 
     return render_template(
         "analytics.html",
         dreams=dreams,
         emotion_counts=emotion_counts,
-        streak=streak,
+        streak=streaks["current"],
+        longest_streak=streaks["longest"],
         total=total,
         personality_title=personality_title,
         personality_desc=personality_desc,
         dominant_emotion=dominant,
         mood_map=mood_map,
-        sleep_data=[dict(r) for r in sleep_data],
+        sleep_rated=stats["sleep_rated"],
         sleep_emotion_avg=sleep_emotion_avg,
+        sleep_by_emotion=stats["sleep_by_emotion"],
+        sleep_trend=stats["trend"],
         top_symbols=top_symbols,
     )
 
 
+@app.route("/analytics/insights.json")
+@login_required
+def analytics_insights():
+    """The full long-range statistics behind /analytics, for charts and export.
+
+    Adds what the page doesn't show: emotion x weekday counts, the 7-day
+    rolling sleep mean (start_day is days since 1970-01-01, local time),
+    mean classifier confidence per emotion and sleep/emotion correlations.
+    """
+    import insights
+    return jsonify(insights.get_insights(session["user_id"]))
+
+
+@app.route("/settings/timezone", methods=["POST"])
+@login_required
+def set_timezone():
+    """Store the browser's IANA timezone so day-based stats use local days."""
+    from zoneinfo import ZoneInfo
+    body = request.get_json(silent=True)
+    tz_name = body.get("timezone") if isinstance(body, dict) else None
+    if not isinstance(tz_name, str):
+        return jsonify({"error": "timezone must be a string"}), 400
+    try:
+        ZoneInfo(tz_name)
+    except (ValueError, KeyError, OSError):
+        return jsonify({"error": "unknown timezone"}), 400
+    if not db.set_user_timezone(session["user_id"], tz_name):
+        return jsonify({"error": "unknown timezone"}), 400
+    session["timezone"] = tz_name
+    return jsonify({"timezone": tz_name})
+
+
 # ── OAuth ──────────────────────────────────────────────────────────────────────
 
 @app.route("/auth/google")
@@ -285,31 +443,16 @@ def oauth_google_callback():
         flash("Invalid OAuth state. Please try again.", "error")
         return redirect(url_for("login"))
 
-    code = request.args.get("code")
-    # Exchange code for tokens
-    token_resp = http_requests.post("https://oauth2.googleapis.com/token", data={
-        "code":          code,
-        "client_id":     os.getenv("GOOGLE_CLIENT_ID"),
-        "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
-        "redirect_uri":  url_for("oauth_google_callback", _external=True),
-        "grant_type":    "authorization_code",
-    })
-    token_data = token_resp.json()
-    access_token = token_data.get("access_token")
-    if not access_token:
-        flash("Failed to get access token from Google.", "error")
+    import oauth
+    try:
+        oauth_id, name, email = oauth.google_login(
+            request.args.get("code"), url_for("oauth_google_callback", _external=True)
+        )
+    except oauth.OAuthError as e:
+        print("Google OAuth error:", e)
+        flash("Google login failed. Please try again.", "error")
         return redirect(url_for("login"))
 
-    # Fetch user profile
-    profile = http_requests.get(
-        "https://www.googleapis.com/oauth2/v2/userinfo",
-        headers={"Authorization": f"Bearer {access_token}"}
-    ).json()
-
-    email    = profile.get("email", "")
-    name     = profile.get("name", email.split("@")[0])
-    oauth_id = f"google:{profile.get('id')}"
-
     user = db.get_or_create_oauth_user(oauth_id=oauth_id, username=name, email=email)
     if user.get("is_blocked"):
         flash("Your account has been suspended. Contact support.", "error")
@@ -317,6 +460,7 @@ def oauth_google_callback():
     session["user_id"]  = user["id"]
     session["username"] = user["username"]
     session["is_admin"] = bool(user.get("is_admin"))
+    session["timezone"] = user.get("timezone") or "UTC"
     return redirect(url_for("index"))
 
 
@@ -347,45 +491,16 @@ def oauth_github_callback():
         flash("Invalid OAuth state. Please try again.", "error")
         return redirect(url_for("login"))
 
-    code = request.args.get("code")
-    # Exchange code for token
-    token_resp = http_requests.post(
-        "https://github.com/login/oauth/access_token",
-        headers={"Accept": "application/json"},
-        data={
-            "client_id":     os.getenv("GITHUB_CLIENT_ID"),
-            "client_secret": os.getenv("GITHUB_CLIENT_SECRET"),
-            "code":          code,
-            "redirect_uri":  url_for("oauth_github_callback", _external=True),
-        }
-    ).json()
-
-    access_token = token_resp.get("access_token")
-    if not access_token:
-        flash("Failed to get access token from GitHub.", "error")
+    import oauth
+    try:
+        oauth_id, username, email = oauth.github_login(
+            request.args.get("code"), url_for("oauth_github_callback", _external=True)
+        )
+    except oauth.OAuthError as e:
+        print("GitHub OAuth error:", e)
+        flash("GitHub login failed. Please try again.", "error")
         return redirect(url_for("login"))
 
-    # Fetch user profile
-    profile = http_requests.get(
-        "https://api.github.com/user",
-        headers={"Authorization": f"Bearer {access_token}",
-                 "Accept": "application/vnd.github+json"}
-    ).json()
-
-    # GitHub may not expose email publicly — fetch separately
-    email = profile.get("email") or ""
-    if not email:
-        emails = http_requests.get(
-            "https://api.github.com/user/emails",
-            headers={"Authorization": f"Bearer {access_token}",
-                     "Accept": "application/vnd.github+json"}
-        ).json()
-        primary = next((e["email"] for e in emails if e.get("primary")), None)
-        email = primary or ""
-
-    username = profile.get("login", f"gh_{profile.get('id')}")
-    oauth_id = f"github:{profile.get('id')}"
-
     user = db.get_or_create_oauth_user(oauth_id=oauth_id, username=username, email=email)
     if user.get("is_blocked"):
         flash("Your account has been suspended. Contact support.", "error")
@@ -393,6 +508,7 @@ def oauth_github_callback():
     session["user_id"]  = user["id"]
     session["username"] = user["username"]
     session["is_admin"] = bool(user.get("is_admin"))
+    session["timezone"] = user.get("timezone") or "UTC"
     return redirect(url_for("index"))
 
 
@@ -451,10 +567,48 @@ def admin_user_dreams(user_id):
                            active_tab="dreams", filter_user=target)
 
 
+@app.route("/admin/ai-status")
+@admin_required
+def admin_ai_status():
+    """Circuit breaker / concurrency limiter state for the HF endpoints."""
+    return jsonify(get_ai().status())
+
+
+@app.route("/admin/db-status")
+@admin_required
+def admin_db_status():
+    """Read-replica health and routing counts."""
+    return jsonify(db.replica_status())
+
+
+@app.route("/admin/purge-status")
+@admin_required
+def admin_purge_status():
+    """Tombstone purger progress and the rows still waiting."""
+    return jsonify({**purger.status(), "backlog": db.get_purge_backlog()})
+
+
+@app.route("/admin/profiles")
+@admin_required
+def admin_profiles():
+    stats    = db.get_admin_stats()
+    users    = db.get_all_users()
+    profiles = profiler.list_profiles()
+    return render_template("admin.html", stats=stats, users=users, dreams=[],
+                           profiles=profiles, active_tab="profiles")
+
+
+@app.route("/admin/profiles/<name>.<any(folded, json):ext>")
+@admin_required
+def admin_profile_file(name, ext):
+    return send_from_directory(profiler.PROFILE_DIR, f"{name}.{ext}", as_attachment=True)
+
+
 @app.route("/admin/dream/<int:dream_id>/delete", methods=["POST"])
 @admin_required
 def admin_delete_dream(dream_id):
     db.admin_delete_dream(dream_id)
+    purger.wake()
     flash("Dream deleted.", "success")
     next_url = request.form.get("next") or url_for("admin_dreams")
     return redirect(next_url)
@@ -486,7 +640,8 @@ def admin_delete_user(user_id):
         flash("You cannot delete yourself.", "error")
         return redirect(url_for("admin_users"))
     db.admin_delete_user(user_id)
-    flash("User and all their data deleted.", "success")
+    purger.wake()
+    flash("User deleted. Their data is being removed in the background.", "success")
     return redirect(url_for("admin_users"))
 
 
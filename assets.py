@@ -0,0 +1,165 @@
+"""Fingerprinted static assets and response compression.
+
+    python assets.py        # build static/dist/ from static/css and static/js
+
+Each source file is copied to static/dist/<dir>/<name>.<hash>.<ext> with
+.gz (and .br when the brotli module is installed) siblings, and
+static/dist/manifest.json maps source paths to the hashed names. Templates
+call asset_url("css/base.css"). Without a manifest (no build step ran, as on
+Vercel, where static/dist/ isn't deployed) the sources are fingerprinted and
+compressed in memory on first use and served from there, with the same
+hashed URLs and immutable caching.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+from flask import Response, abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST = os.path.join(DIST_DIR, "manifest.json")
+SOURCE_DIRS = ("css", "js")
+COMPRESSIBLE = ("text/html", "text/css", "text/plain", "application/json",
+                "application/javascript", "text/javascript")
+MIN_COMPRESS_BYTES = 1024
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_manifest = None
+_memory = {}  # hashed path -> {encoding: bytes} when there is no built dist/
+
+
+def _sources():
+    """Yield (source path, hashed path, contents) for every source asset."""
+    for sub in SOURCE_DIRS:
+        src_dir = os.path.join(STATIC_DIR, sub)
+        if not os.path.isdir(src_dir):
+            continue
+        for name in sorted(os.listdir(src_dir)):
+            with open(os.path.join(src_dir, name), "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(name)
+            hashed = f"{sub}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            yield f"{sub}/{name}", hashed, data
+
+
+def _compressed(data):
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return variants
+
+
+def build():
+    """Write hashed + precompressed copies of every source asset."""
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    manifest = {}
+    for src, hashed, data in _sources():
+        out = os.path.join(DIST_DIR, hashed)
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        with open(out, "wb") as f:
+            f.write(data)
+        for encoding, compressed in _compressed(data).items():
+            with open(out + (".br" if encoding == "br" else ".gz"), "wb") as f:
+                f.write(compressed)
+        manifest[src] = hashed
+    with open(MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _load_manifest():
+    global _manifest, _memory
+    if _manifest is None:
+        try:
+            with open(MANIFEST) as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest, memory = {}, {}
+            for src, hashed, data in _sources():
+                manifest[src] = hashed
+                memory[hashed] = {"identity": data, **_compressed(data)}
+            _memory, _manifest = memory, manifest
+    return _manifest
+
+
+def asset_url(path):
+    hashed = _load_manifest().get(path)
+    if hashed:
+        return url_for("assets", filename=hashed)
+    return url_for("static", filename=path)
+
+
+def _accepts(encoding):
+    return encoding in request.headers.get("Accept-Encoding", "")
+
+
+def _mimetype(filename):
+    return "text/css" if filename.endswith(".css") else "text/javascript"
+
+
+def serve_asset(filename):
+    """Serve a hashed asset, preferring a precompressed variant."""
+    _load_manifest()
+    if _memory:
+        variants = _memory.get(filename) or abort(404)
+        encoding = next((e for e in ("br", "gzip") if e in variants and _accepts(e)),
+                        "identity")
+        response = Response(variants[encoding], mimetype=_mimetype(filename))
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Cache-Control"] = IMMUTABLE
+        response.vary.add("Accept-Encoding")
+        return response
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if _accepts(encoding) and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            response = send_from_directory(DIST_DIR, filename + suffix)
+            response.mimetype = _mimetype(filename)
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename)
+    response.headers["Cache-Control"] = IMMUTABLE
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def compress_response(response):
+    """Compress dynamic text responses on the fly (brotli if possible, else gzip)."""
+    if (response.direct_passthrough or response.status_code < 200
+            or response.status_code >= 300
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+    if brotli is not None and _accepts("br"):
+        response.set_data(brotli.compress(data, quality=4))
+        response.headers["Content-Encoding"] = "br"
+    elif _accepts("gzip"):
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        return response
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def init_app(app):
+    app.add_url_rule("/assets/<path:filename>", "assets", serve_asset)
+    app.jinja_env.globals["asset_url"] = asset_url
+    app.after_request(compress_response)
+
+
+if __name__ == "__main__":
+    for src, hashed in build().items():
+        print(f"{src} -> {hashed}")
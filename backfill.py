@@ -0,0 +1,85 @@
+"""Re-analyze dreams that were saved with fallback AI output.
+
+    python backfill.py                  # everything
+    python backfill.py --limit 500 --dry-run
+
+Finds live dreams with the canned interpretation, the zero-confidence
+neutral emotion, or no symbols, and runs them through DreamAI again: the
+local model and/or HF, depending on LOCAL_LLM_MODE, paced by the fair
+scheduler's "reanalyze" tier. Only the parts that now come back real are
+written, so it is safe to re-run. It stops early if the AI still looks
+unavailable.
+"""
+import argparse
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import database as db
+from ai_model import FALLBACK_INTERPRETATION, DreamAI
+
+PAGE_SIZE = 100
+
+
+def improved(dream, interpretation, emotion, symbols):
+    """The parts of a fresh analysis worth writing back for this dream."""
+    parts = {}
+    if dream["needs_interpretation"] and interpretation != FALLBACK_INTERPRETATION:
+        parts["interpretation"] = interpretation
+    if dream["needs_emotion"] and emotion.get("confidence_primary"):
+        parts["emotion"] = emotion
+    if dream["needs_symbols"] and symbols:
+        parts["symbols"] = symbols
+    return parts
+
+
+def backfill(ai, limit=None, dry_run=False, give_up_after=20):
+    counts = {"seen": 0, "updated": 0, "unchanged": 0}
+    after_id, misses, start = 0, 0, time.monotonic()
+    while limit is None or counts["seen"] < limit:
+        page = db.get_fallback_dreams(FALLBACK_INTERPRETATION, after_id, PAGE_SIZE)
+        if not page:
+            break
+        for dream in page:
+            if limit is not None and counts["seen"] >= limit:
+                break
+            after_id = dream["id"]
+            counts["seen"] += 1
+            if dry_run:
+                continue
+            parts = improved(dream, *ai.analyze(dream["text"], "backfill", tier="reanalyze"))
+            if parts and db.update_dream_analysis(dream["id"], **parts):
+                counts["updated"] += 1
+                misses = 0
+            else:
+                counts["unchanged"] += 1
+                misses += 1
+                if misses >= give_up_after:
+                    print(f"backfill: {misses} dreams in a row still fell back; "
+                          f"the AI looks unavailable, stopping at id {after_id}")
+                    return counts
+        print(f"backfill: {counts} up to id {after_id} "
+              f"({time.monotonic() - start:.0f}s)")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-analyze dreams saved with fallback output")
+    parser.add_argument("--limit", type=int, help="stop after this many dreams")
+    parser.add_argument("--dry-run", action="store_true", help="only count candidates")
+    parser.add_argument("--give-up-after", type=int, default=20,
+                        help="stop after this many consecutive dreams still fall back")
+    args = parser.parse_args()
+    ai = DreamAI()
+    if ai.local is not None:
+        ai.local.warm()
+    counts = backfill(ai, args.limit, args.dry_run, args.give_up_after)
+    print(f"backfill: done, {counts}")
+    if ai.local is not None:
+        print(f"local model: {ai.local.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Concurrent-submission capacity per MB of RAM: sync vs gevent workers.
+
+    DATABASE_URL=postgresql://localhost/somnia_bench python bench/capacity.py --clients 400
+
+Boots app:app once per worker class against a slow fake HF router, fires
+--clients concurrent dream submissions for --duration seconds, and reports
+achieved in-flight concurrency (Little's law: throughput x mean latency),
+peak RSS of the gunicorn process tree, and concurrency per MB.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import fake_hf  # noqa: E402
+import run  # noqa: E402
+
+
+def tree_rss_mb(pid):
+    """Resident memory of a process and its direct children, in MB."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    total_kb = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            pass
+    return total_kb / 1024
+
+
+def measure(base, proc, users, clients, duration, password):
+    peak = [0.0]
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.is_set():
+            peak[0] = max(peak[0], tree_rss_mb(proc.pid))
+            time.sleep(0.25)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    result = run.run_scenario(base, "submit", users, clients, duration, password)
+    done.set()
+    sampler.join()
+
+    in_flight = result["rps"] * result["mean_ms"] / 1000
+    result.update({
+        "in_flight": round(in_flight, 1),
+        "rss_mb": round(peak[0], 1),
+        "in_flight_per_mb": round(in_flight / peak[0], 3) if peak[0] else 0.0,
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Submission capacity per MB")
+    parser.add_argument("--scale", default="1k", choices=["1k", "100k", "1m"])
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--sync-workers", type=int, default=4)
+    parser.add_argument("--gevent-workers", type=int, default=1)
+    parser.add_argument("--hf-latency-ms", type=float, default=1500.0)
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("Set DATABASE_URL")
+    hf_server, hf_url = fake_hf.start_in_thread(
+        fake_hf.FakeHF(latency_ms=args.hf_latency_ms, jitter_ms=args.hf_latency_ms / 10))
+    env = dict(os.environ, HF_ROUTER_URL=hf_url,
+               DATABASE_SSLMODE=os.getenv("DATABASE_SSLMODE", "disable"),
+               HF_CONCURRENCY_INITIAL=str(args.clients),
+               HF_CONCURRENCY_MAX=str(args.clients * 2),
+               AUTH_BURST_PER_IP="100000", AUTH_BURST_PER_USERNAME="100000",
+               AI_QUOTA_RPS="100000", AI_QUOTA_BURST="100000", AI_QUEUE_PER_USER="1000",
+               SECRET_KEY="bench", PYTHONPATH=run.ROOT)
+    os.environ["DATABASE_SSLMODE"] = env["DATABASE_SSLMODE"]
+
+    import seed
+    users = seed.seed(args.scale)
+    try:
+        for worker_class, workers in (("sync", args.sync_workers),
+                                      ("gevent", args.gevent_workers)):
+            proc, base = run.start_gunicorn(
+                dict(env, GUNICORN_WORKER_CLASS=worker_class), workers)
+            try:
+                r = measure(base, proc, users, args.clients, args.duration,
+                            seed.BENCH_PASSWORD)
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(f"{worker_class:<7} x{workers}  {r['rps']:>7.1f} subs/s  "
+                  f"in-flight {r['in_flight']:>6.1f}  rss {r['rss_mb']:>7.1f}MB  "
+                  f"{r['in_flight_per_mb']:.3f} in-flight/MB  p99 {r['p99_ms']}ms  "
+                  f"errors {r['errors']}")
+    finally:
+        hf_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Per-user p95 of DreamAI.analyze() under skewed load: FIFO vs fair share.
+
+    python bench/fairness.py --light-users 8 --heavy-threads 12 --duration 20
+
+One "heavy" user submits from --heavy-threads threads in a loop while each
+light user submits one dream every --think-ms. Both runs share the same
+quota (--quota-rps); the FIFO run puts everyone under one scheduler key, the
+fair run keys by user. Needs no database: DreamAI talks to the fake router.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fake_hf  # noqa: E402
+import run  # noqa: E402
+
+
+def measure(ai, fair, light_users, heavy_threads, duration, think):
+    latencies = {"heavy": [], "light": []}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def submit(kind, user):
+        key = user if fair else "everyone"
+        start = time.perf_counter()
+        ai.analyze("I was late for an exam in a school with no doors.", key)
+        with lock:
+            latencies[kind].append(time.perf_counter() - start)
+
+    def heavy():
+        while time.monotonic() < stop_at:
+            submit("heavy", "heavy")
+
+    def light(i):
+        while time.monotonic() < stop_at:
+            submit("light", f"light_{i}")
+            time.sleep(think)
+
+    threads = ([threading.Thread(target=heavy) for _ in range(heavy_threads)]
+               + [threading.Thread(target=light, args=(i,)) for i in range(light_users)])
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {kind: run.summarize(sorted(v), 0, duration) for kind, v in latencies.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fair-share scheduler under skewed load")
+    parser.add_argument("--light-users", type=int, default=8)
+    parser.add_argument("--heavy-threads", type=int, default=12)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--think-ms", type=float, default=1000.0)
+    parser.add_argument("--quota-rps", type=float, default=15.0)
+    parser.add_argument("--hf-latency-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    hf_server, hf_url = fake_hf.start_in_thread(
+        fake_hf.FakeHF(latency_ms=args.hf_latency_ms, jitter_ms=args.hf_latency_ms / 5))
+    os.environ.update(HF_ROUTER_URL=hf_url, AI_QUOTA_RPS=str(args.quota_rps),
+                      AI_QUOTA_BURST=str(args.quota_rps),
+                      AI_QUEUE_PER_USER=str(args.heavy_threads + args.light_users),
+                      AI_QUEUE_TIMEOUT="600",
+                      HF_CONCURRENCY_INITIAL="64", HF_CONCURRENCY_MAX="256")
+    from ai_model import DreamAI
+    try:
+        for mode in ("fifo", "fair"):
+            result = measure(DreamAI(), mode == "fair", args.light_users,
+                             args.heavy_threads, args.duration, args.think_ms / 1000)
+            for kind in ("light", "heavy"):
+                r = result[kind]
+                print(f"{mode:<5} {kind:<6} {r['requests']:>5} analyses  "
+                      f"p50 {r['p50_ms']:>8.1f}ms  p95 {r['p95_ms']:>8.1f}ms  "
+                      f"p99 {r['p99_ms']:>8.1f}ms")
+    finally:
+        hf_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Local stand-in for the Hugging Face router.
+
+Serves the two endpoints DreamAI uses with configurable latency and error
+injection. Run standalone or start from bench/run.py:
+
+    python bench/fake_hf.py --port 8089 --latency-ms 300 --tail-ms 4000 --tail-rate 0.02
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SYMBOLS = ["water", "falling", "flying", "dark forest", "unknown figure",
+           "house", "teeth", "chase", "ocean", "mirror", "door", "snake"]
+EMOTIONS = ["joy", "fear", "sadness", "surprise", "anger", "neutral", "confusion"]
+
+
+class FakeHF:
+    def __init__(self, latency_ms=200.0, jitter_ms=50.0, tail_ms=0.0,
+                 tail_rate=0.0, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_ms = tail_ms
+        self.tail_rate = tail_rate
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        if self.tail_rate and random.random() < self.tail_rate:
+            # Heavy tail: Pareto-distributed outliers around tail_ms
+            ms = self.tail_ms * random.paretovariate(2.5) / 1.67
+        else:
+            ms = max(0.0, random.gauss(self.latency_ms, self.jitter_ms))
+        return ms / 1000
+
+    def respond(self, path, body):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.delay())
+        if self.error_rate and random.random() < self.error_rate:
+            return 503, {"error": "injected failure"}
+        if path.endswith("/chat/completions"):
+            system = body.get("messages", [{}])[0].get("content", "")
+            if "symbol extractor" in system:
+                content = json.dumps(random.sample(SYMBOLS, 4))
+            else:
+                content = "Your dream speaks of transition. The imagery suggests a mind working through change, gently."
+            return 200, {"choices": [{"message": {"role": "assistant", "content": content}}]}
+        if "/hf-inference/models/" in path:
+            scores = sorted((random.random() for _ in EMOTIONS), reverse=True)
+            total = sum(scores)
+            labels = random.sample(EMOTIONS, len(EMOTIONS))
+            return 200, [[{"label": l, "score": s / total} for l, s in zip(labels, scores)]]
+        return 404, {"error": "not found"}
+
+
+def make_server(fake, host="127.0.0.1", port=0):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                body = {}
+            status, payload = fake.respond(self.path, body)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(fake, host="127.0.0.1", port=0):
+    """Start the fake router in a daemon thread; returns (server, base_url)."""
+    server = make_server(fake, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--tail-ms", type=float, default=0.0)
+    parser.add_argument("--tail-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+
+
+def from_args(args):
+    return FakeHF(args.latency_ms, args.jitter_ms, args.tail_ms,
+                  args.tail_rate, args.error_rate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = make_server(from_args(args), args.host, args.port)
+    print(f"Fake HF router on http://{args.host}:{args.port}")
+    server.serve_forever()
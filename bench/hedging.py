@@ -0,0 +1,101 @@
+"""Tail latency of DreamAI.interpret() against a heavy-tailed router: hedging off vs on.
+
+    python bench/hedging.py --requests 600 --concurrency 8 --tail-ms 3000 --tail-rate 0.03
+
+Both runs use the same fake router, where --tail-rate of the calls take
+around --tail-ms (Pareto-distributed) instead of --latency-ms. The second run sets
+HF_HEDGE=1, so a duplicate call goes out once a request passes the running
+p95 (HF_HEDGE_PERCENTILE), within --budget of the traffic. Prints
+p50/p95/p99 per run, the hedger's counters and how many extra router calls
+hedging cost. Needs no database.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import fake_hf  # noqa: E402
+import run  # noqa: E402
+
+DREAM = "I kept missing a train that left from the middle of a frozen lake."
+
+
+def measure(fake, hedge, requests_total, concurrency, budget):
+    os.environ["HF_HEDGE"] = "1" if hedge else ""
+    os.environ["HF_HEDGE_BUDGET"] = str(budget)
+    from ai_model import FALLBACK_INTERPRETATION, DreamAI
+    ai = DreamAI()
+
+    latencies, fallbacks = [], 0
+    lock = threading.Lock()
+    remaining = iter(range(requests_total))
+    calls_before = fake.requests
+
+    def worker():
+        nonlocal fallbacks
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            text = ai.interpret(DREAM)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                fallbacks += text == FALLBACK_INTERPRETATION
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    result = run.summarize(latencies, fallbacks, time.perf_counter() - started)
+    result["router_calls"] = fake.requests - calls_before
+    result["hedger"] = ai.status().get("hedging")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request hedging against a heavy-tailed router")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--budget", type=float, default=0.05,
+                        help="HF_HEDGE_BUDGET: fraction of calls that may be duplicated")
+    fake_hf.add_arguments(parser)
+    parser.set_defaults(latency_ms=100.0, jitter_ms=20.0, tail_ms=3000.0, tail_rate=0.03)
+    args = parser.parse_args()
+
+    fake = fake_hf.from_args(args)
+    hf_server, hf_url = fake_hf.start_in_thread(fake)
+    # Hedges are charged to the AI quota; keep it out of the way here
+    os.environ.update(HF_ROUTER_URL=hf_url, HF_TIMEOUT="60", LOCAL_LLM_MODE="off",
+                      AI_QUOTA_RPS="100000", AI_QUOTA_BURST="100000",
+                      HF_CONCURRENCY_INITIAL=str(4 * args.concurrency),
+                      HF_CONCURRENCY_MAX=str(8 * args.concurrency))
+    results = {}
+    try:
+        for mode in ("off", "on"):
+            r = results[mode] = measure(fake, mode == "on", args.requests,
+                                        args.concurrency, args.budget)
+            print(f"hedging {mode:<3} {r['requests']:>5} calls  p50 {r['p50_ms']:>8.1f}ms  "
+                  f"p95 {r['p95_ms']:>8.1f}ms  p99 {r['p99_ms']:>8.1f}ms  "
+                  f"router calls {r['router_calls']:>5}  fallbacks {r['errors']}")
+            if r["hedger"]:
+                print(f"            hedger {r['hedger']}")
+    finally:
+        hf_server.shutdown()
+
+    off, on = results["off"], results["on"]
+    extra = on["router_calls"] / max(1, on["requests"]) - 1
+    print(f"p99 {off['p99_ms']:.0f}ms -> {on['p99_ms']:.0f}ms "
+          f"({on['p99_ms'] / off['p99_ms'] - 1:+.0%}) for {extra:+.1%} router calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Tokens per second per core for the local llama.cpp backend.
+
+    python bench/llm_throughput.py --model models/qwen2.5-1.5b-instruct-q4_k_m.gguf --threads 1,2,4,8
+
+For each thread count it loads the model once, warms it with one prompt,
+then runs --prompts interpretation prompts through LocalLLM.chat, each once
+with a cleared KV cache and one output token (prefill) and once more in full
+(generation). It reports both throughputs overall and per core. Needs
+llama-cpp-python.
+"""
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import local_llm  # noqa: E402
+from ai_model import INTERPRET_PROMPT  # noqa: E402
+
+DREAMS = [
+    "I was flying over a dark ocean toward a lighthouse that kept moving away.",
+    "My teeth were falling out while I tried to give a speech at my old school.",
+    "A staircase spiralled up through the clouds to a locked blue door.",
+    "I was chased through a forest by someone I couldn't see, but I wasn't afraid.",
+]
+
+
+def measure(model, threads, prompts, max_tokens):
+    llm = local_llm.LocalLLM(model, threads=threads, queue=1)
+    llm.warm()
+    messages = lambda text: [{"role": "system", "content": INTERPRET_PROMPT},
+                             {"role": "user", "content": f"Interpret this dream: {text}"}]
+    llm.chat(messages(DREAMS[0]), max_tokens=8)  # first call pays one-off setup
+    before = llm.stats()
+
+    prefill = generation = 0.0
+    for i in range(prompts):
+        text = DREAMS[i % len(DREAMS)]
+        # One-token call on a cleared KV cache: almost all prefill
+        llm.warm().reset()
+        start = time.perf_counter()
+        llm.chat(messages(text), max_tokens=1, temperature=0.0)
+        prefill += time.perf_counter() - start
+        # Same prompt again: its KV prefix is reused, so this is generation
+        start = time.perf_counter()
+        llm.chat(messages(text), max_tokens=max_tokens, temperature=0.7)
+        generation += time.perf_counter() - start
+    after = llm.stats()
+    prompt_tokens = (after["prompt_tokens"] - before["prompt_tokens"]) // 2
+    completion_tokens = after["completion_tokens"] - before["completion_tokens"] - prompts
+    return {
+        "threads": threads,
+        "load_s": after["load_seconds"],
+        "prefill_tps": prompt_tokens / prefill if prefill else 0.0,
+        "gen_tps": completion_tokens / generation if generation else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local LLM tokens/sec/core")
+    parser.add_argument("--model", default=os.getenv("LOCAL_LLM_MODEL"))
+    parser.add_argument("--threads", default=str(os.cpu_count() or 1),
+                        help="comma-separated thread counts")
+    parser.add_argument("--prompts", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=128)
+    args = parser.parse_args()
+    if local_llm.llama_cpp is None:
+        raise SystemExit("pip install llama-cpp-python to run this benchmark")
+    if not args.model or not os.path.isfile(args.model):
+        raise SystemExit("Pass --model path/to/model.gguf (or set LOCAL_LLM_MODEL)")
+
+    print(f"{'threads':>7} {'load':>7} {'prefill tok/s':>14} {'/core':>8} "
+          f"{'gen tok/s':>10} {'/core':>8}")
+    for threads in (int(t) for t in args.threads.split(",")):
+        r = measure(args.model, threads, args.prompts, args.max_tokens)
+        print(f"{r['threads']:>7} {r['load_s']:>6.1f}s {r['prefill_tps']:>14.1f} "
+              f"{r['prefill_tps'] / threads:>8.1f} {r['gen_tps']:>10.1f} "
+              f"{r['gen_tps'] / threads:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Read-replica routing check against two local Postgres instances.
+
+    python bench/replicas.py        # needs initdb, pg_ctl and pg_basebackup on PATH
+
+Starts a throwaway primary plus a streaming replica (pg_basebackup -R) whose
+replay is held back by --apply-delay-ms, boots app:app with
+DATABASE_REPLICA_URLS pointing at the replica, and checks that:
+
+  1. a freshly registered user can log in, and a dream shows up in /history
+     straight after it is submitted, although the replica hasn't replayed
+     either write yet (read-your-writes);
+  2. once the read-your-writes window has passed, reads go to the replica;
+  3. with the replica stopped, reads fall back to the primary.
+
+Exits non-zero if any check fails.
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import fake_hf  # noqa: E402
+import run  # noqa: E402
+
+METRICS_TOKEN = "bench"
+DREAM = "A staircase spiralled up through the clouds to a locked blue door."
+
+
+def start_cluster(apply_delay_ms):
+    """Primary + delayed streaming replica; returns (primary_url, replica_url, stop_replica, stop)."""
+    for tool in ("initdb", "pg_ctl", "pg_basebackup"):
+        if not shutil.which(tool):
+            raise SystemExit(f"{tool} not found on PATH")
+    root = tempfile.mkdtemp(prefix="somnia-replicas-")
+    primary, replica = os.path.join(root, "primary"), os.path.join(root, "replica")
+    p_port, r_port = run._free_port(), run._free_port()
+
+    subprocess.run(["initdb", "-D", primary, "-A", "trust", "-U", "postgres"],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(["pg_ctl", "-D", primary, "-w", "-l", os.path.join(root, "primary.log"),
+                    "-o", f"-p {p_port} -k {root} -c fsync=off -c wal_level=replica", "start"],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(["createdb", "-h", root, "-p", str(p_port), "-U", "postgres", "somnia"],
+                   check=True)
+    subprocess.run(["pg_basebackup", "-h", "127.0.0.1", "-p", str(p_port), "-U", "postgres",
+                    "-D", replica, "-R", "-X", "stream"], check=True)
+    subprocess.run(["pg_ctl", "-D", replica, "-w", "-l", os.path.join(root, "replica.log"),
+                    "-o", f"-p {r_port} -k {root} -c fsync=off "
+                          f"-c recovery_min_apply_delay={int(apply_delay_ms)}ms", "start"],
+                   check=True, stdout=subprocess.DEVNULL)
+
+    def stop_replica():
+        subprocess.run(["pg_ctl", "-D", replica, "-m", "immediate", "stop"],
+                       stdout=subprocess.DEVNULL)
+
+    def stop():
+        stop_replica()
+        subprocess.run(["pg_ctl", "-D", primary, "-m", "fast", "stop"], stdout=subprocess.DEVNULL)
+        shutil.rmtree(root, ignore_errors=True)
+
+    return (f"postgresql://postgres@127.0.0.1:{p_port}/somnia",
+            f"postgresql://postgres@127.0.0.1:{r_port}/somnia", stop_replica, stop)
+
+
+def read_counts(base):
+    """db_read_connections_total by target, from /metrics."""
+    text = requests.get(base + "/metrics",
+                        headers={"Authorization": f"Bearer {METRICS_TOKEN}"}).text
+    return {target: float(value) for target, value in re.findall(
+        r'^db_read_connections_total\{target="(\w+)"\} (\S+)$', text, re.M)}
+
+
+def reads_during(base, session, path="/history"):
+    before = read_counts(base)
+    r = session.get(base + path)
+    after = read_counts(base)
+    return r, {k: after.get(k, 0) - before.get(k, 0) for k in after}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-replica routing check")
+    parser.add_argument("--apply-delay-ms", type=float, default=3000)
+    parser.add_argument("--window-s", type=float, default=5,
+                        help="DATABASE_READ_YOUR_WRITES_SECONDS for the app")
+    args = parser.parse_args()
+
+    primary_url, replica_url, stop_replica, stop = start_cluster(args.apply_delay_ms)
+    hf_server, hf_url = fake_hf.start_in_thread(fake_hf.FakeHF(latency_ms=5, jitter_ms=0))
+    env = dict(os.environ, DATABASE_URL=primary_url, DATABASE_REPLICA_URLS=replica_url,
+               DATABASE_SSLMODE="disable", DATABASE_READ_YOUR_WRITES_SECONDS=str(args.window_s),
+               DATABASE_REPLICA_RETRY_SECONDS="60", HF_ROUTER_URL=hf_url,
+               SECRET_KEY="bench", METRICS_TOKEN=METRICS_TOKEN, PYTHONPATH=run.ROOT)
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    proc = None
+    failures = []
+
+    def check(ok, message):
+        print(("ok    " if ok else "FAIL  ") + message)
+        if not ok:
+            failures.append(message)
+
+    try:
+        proc, base = run.start_gunicorn(env, 1)  # one worker: /metrics sees every read
+
+        s = requests.Session()
+        s.post(base + "/register", data={"username": "replica_check", "password": "pw-check-1"})
+        r = s.post(base + "/login", data={"username": "replica_check", "password": "pw-check-1"},
+                   allow_redirects=False)
+        check(r.status_code == 302 and "login" not in r.headers.get("Location", ""),
+              "login right after register (user not yet on the replica)")
+
+        s.post(base + "/", data={"dream": DREAM, "sleep_quality": "4"})
+        r, reads = reads_during(base, s)
+        check(DREAM in r.text, "dream visible in /history immediately after submit")
+        check(reads.get("replica", 0) == 0,
+              f"lagging replica skipped inside the window (reads {reads})")
+
+        time.sleep(max(args.window_s, args.apply_delay_ms / 1000) + 1)
+        r, reads = reads_during(base, s)
+        check(DREAM in r.text and reads.get("replica", 0) > 0,
+              f"replica serves reads after the window (reads {reads})")
+
+        stop_replica()
+        r, reads = reads_during(base, s)
+        check(r.status_code == 200 and DREAM in r.text and reads.get("replica", 0) == 0,
+              f"reads fall back to the primary with the replica down (reads {reads})")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        hf_server.shutdown()
+        stop()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""Load benchmark: boot app:app under gunicorn against local stand-ins.
+
+    DATABASE_URL=postgresql://localhost/somnia_bench python bench/run.py --scale 1k
+    python bench/run.py --ephemeral-postgres --scale 1k     # needs initdb/pg_ctl on PATH
+
+Runs the submit, history, analytics and admin scenarios, prints throughput
+and p50/p95/p99, and exits non-zero if any scenario regresses more than
+--tolerance against bench/baseline.json, or has no baseline entry to be
+checked against. --update-baseline records the results there instead.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import fake_hf  # noqa: E402
+
+BASELINE = os.path.join(HERE, "baseline.json")
+
+
+def scenario_submit(s, base):
+    return s.post(base + "/", data={"dream": "I was flying over a dark ocean toward a lighthouse.",
+                                    "sleep_quality": "3"})
+
+
+def scenario_history(s, base):
+    return s.get(base + "/history")
+
+
+def scenario_analytics(s, base):
+    return s.get(base + "/analytics")
+
+
+def scenario_admin(s, base):
+    return s.get(base + "/admin")
+
+
+SCENARIOS = {
+    "submit": (scenario_submit, False),
+    "history": (scenario_history, False),
+    "analytics": (scenario_analytics, False),
+    "admin": (scenario_admin, True),
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_ephemeral_postgres():
+    """initdb a throwaway cluster in a temp dir; returns (url, stop)."""
+    if not shutil.which("initdb"):
+        raise SystemExit("--ephemeral-postgres needs initdb and pg_ctl on PATH")
+    data = tempfile.mkdtemp(prefix="somnia-pg-")
+    port = _free_port()
+    subprocess.run(["initdb", "-D", data, "-A", "trust", "-U", "postgres"],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(["pg_ctl", "-D", data, "-w", "-l", os.path.join(data, "log"),
+                    "-o", f"-p {port} -k {data} -c fsync=off", "start"],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(["createdb", "-h", data, "-p", str(port), "-U", "postgres", "somnia_bench"],
+                   check=True)
+
+    def stop():
+        subprocess.run(["pg_ctl", "-D", data, "-m", "fast", "stop"], stdout=subprocess.DEVNULL)
+        shutil.rmtree(data, ignore_errors=True)
+
+    return f"postgresql://postgres@127.0.0.1:{port}/somnia_bench", stop
+
+
+def start_gunicorn(env, workers, extra_args=()):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{port}",
+         "-w", str(workers), "--timeout", "120", *extra_args],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    _wait_for(base + "/login")
+    return proc, base
+
+
+def login(base, username, password):
+    s = requests.Session()
+    r = s.post(base + "/login", data={"username": username, "password": password},
+               allow_redirects=False)
+    if r.status_code != 302 or "login" in r.headers.get("Location", ""):
+        raise RuntimeError(f"login failed for {username}: {r.status_code}")
+    return s
+
+
+def run_scenario(base, name, users, concurrency, duration, password):
+    fn, needs_admin = SCENARIOS[name]
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(i):
+        username = "bench_admin" if needs_admin else f"bench_{random.randrange(users)}"
+        s = login(base, username, password)
+        local = []
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                r = fn(s, base)
+                ok = r.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if ok:
+                local.append(elapsed)
+            else:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - start
+    return summarize(latencies, errors[0], wall)
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100.0))]
+
+
+def summarize(latencies, errors, wall):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / wall, 2) if wall else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of human-readable regressions.
+
+    A scenario without a baseline entry counts as one: otherwise a missing
+    or stale baseline.json would pass every run.
+    """
+    regressions = []
+    for key, cur in results.items():
+        ref = baseline.get(key)
+        if not ref:
+            regressions.append(f"{key}: no baseline entry (record one with --update-baseline)")
+            continue
+        if ref["rps"] and cur["rps"] < ref["rps"] * (1 - tolerance):
+            regressions.append(f"{key}: rps {cur['rps']} < baseline {ref['rps']}")
+        for p in ("p50_ms", "p95_ms", "p99_ms"):
+            if ref[p] and cur[p] > ref[p] * (1 + tolerance):
+                regressions.append(f"{key}: {p} {cur[p]} > baseline {ref[p]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Somnia load benchmark")
+    parser.add_argument("--scale", default="1k", choices=["1k", "100k", "1m"])
+    parser.add_argument("--no-seed", action="store_true", help="reuse already-seeded data")
+    parser.add_argument("--ephemeral-postgres", action="store_true")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--gunicorn-arg", action="append", default=[],
+                        help="extra argument passed through to gunicorn")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--update-baseline", action="store_true")
+    fake_hf.add_arguments(parser)
+    args = parser.parse_args()
+
+    stop_pg = None
+    if args.ephemeral_postgres:
+        database_url, stop_pg = start_ephemeral_postgres()
+    else:
+        database_url = os.getenv("DATABASE_URL")
+        if not database_url:
+            raise SystemExit("Set DATABASE_URL or pass --ephemeral-postgres")
+
+    hf_server, hf_url = fake_hf.start_in_thread(fake_hf.from_args(args))
+    env = dict(os.environ, DATABASE_URL=database_url, HF_ROUTER_URL=hf_url,
+               DATABASE_SSLMODE=os.getenv("DATABASE_SSLMODE", "disable"),
+               AUTH_BURST_PER_IP="100000", AUTH_BURST_PER_USERNAME="100000",
+               AI_QUOTA_RPS="100000", AI_QUOTA_BURST="100000", AI_QUEUE_PER_USER="1000",
+               SECRET_KEY="bench", PYTHONPATH=ROOT)
+    os.environ.update({k: env[k] for k in ("DATABASE_URL", "DATABASE_SSLMODE")})
+
+    proc = None
+    try:
+        import seed
+        if args.no_seed:
+            users = max(1, seed.SCALES[args.scale] // seed.DREAMS_PER_USER)
+        else:
+            users = seed.seed(args.scale)
+        proc, base = start_gunicorn(env, args.workers, args.gunicorn_arg)
+
+        results = {}
+        for name in args.scenarios.split(","):
+            key = f"{args.scale}/{name}"
+            results[key] = run_scenario(base, name, users, args.concurrency,
+                                        args.duration, seed.BENCH_PASSWORD)
+            r = results[key]
+            print(f"{key:<18} {r['rps']:>8.1f} req/s  p50 {r['p50_ms']:>7.1f}ms  "
+                  f"p95 {r['p95_ms']:>7.1f}ms  p99 {r['p99_ms']:>7.1f}ms  errors {r['errors']}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        hf_server.shutdown()
+        if stop_pg:
+            stop_pg()
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    elif not args.update_baseline:
+        print(f"No baseline at {BASELINE}; nothing was checked for regressions")
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {BASELINE}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Seed a database with synthetic users, dreams and symbols.
+
+    DATABASE_URL=postgresql://localhost/somnia_bench python bench/seed.py --scale 100k
+
+Every seeded user is named bench_<n> and has the password BENCH_PASSWORD;
+bench_admin is an admin. Existing bench_* rows are replaced.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+BENCH_PASSWORD = "bench-password"
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+DREAMS_PER_USER = 50
+EMOTIONS = ["joy", "fear", "sadness", "surprise", "anger", "neutral",
+            "confusion", "nervousness", "curiosity", "love"]
+SYMBOLS = ["water", "falling", "flying", "dark forest", "unknown figure", "house",
+           "teeth", "chase", "ocean", "mirror", "door", "snake", "school", "train",
+           "mother", "storm", "stairs", "fire", "cat", "exam"]
+WORDS = ("I was walking through a long corridor that kept changing shape and "
+         "the light was strange and someone I knew was calling my name from "
+         "behind a door that would not open no matter how hard I pulled").split()
+
+
+def _copy(cur, table, columns, rows):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join("\\N" if v is None else str(v) for v in row) + "\n")
+    buf.seek(0)
+    cur.copy_from(buf, table, columns=columns)
+
+
+def seed(scale, seed_value=42, batch=20_000):
+    rng = random.Random(seed_value)
+    n_dreams = SCALES[scale]
+    n_users = max(1, n_dreams // DREAMS_PER_USER)
+    hashed = generate_password_hash(BENCH_PASSWORD)
+    now = datetime.now(timezone.utc)
+
+    db.init_db()
+    with db.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM users WHERE username LIKE 'bench\\_%'")
+            cur.execute(
+                "INSERT INTO users (username, password, is_admin) VALUES ('bench_admin', %s, TRUE)",
+                (hashed,),
+            )
+            _copy(cur, "users", ("username", "password", "created_at"),
+                  ((f"bench_{i}", hashed, (now - timedelta(days=rng.randint(0, 720))).isoformat())
+                   for i in range(n_users)))
+            cur.execute("SELECT id FROM users WHERE username LIKE 'bench\\_%' AND NOT is_admin ORDER BY id")
+            user_ids = [r[0] for r in cur.fetchall()]
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM dreams")
+            next_id = cur.fetchone()[0] + 1
+
+            done = 0
+            while done < n_dreams:
+                size = min(batch, n_dreams - done)
+                dreams, symbols = [], []
+                for i in range(size):
+                    dream_id = next_id + done + i
+                    # Skewed ownership: a few heavy users, a long tail of light ones
+                    user_id = user_ids[min(len(user_ids) - 1, int(rng.paretovariate(1.2)) - 1)
+                                       if rng.random() < 0.3 else rng.randrange(len(user_ids))]
+                    created = now - timedelta(days=rng.expovariate(1 / 120), minutes=rng.randint(0, 1440))
+                    text = " ".join(rng.choices(WORDS, k=rng.randint(20, 80)))
+                    dreams.append((
+                        dream_id, user_id, text, "A seeded interpretation.",
+                        rng.choice(EMOTIONS), rng.choice(EMOTIONS),
+                        round(rng.random(), 2), round(rng.random() / 2, 2),
+                        rng.randint(1, 5) if rng.random() < 0.7 else None,
+                        created.isoformat(),
+                    ))
+                    for sym in rng.sample(SYMBOLS, rng.randint(3, 6)):
+                        symbols.append((dream_id, user_id, sym))
+                _copy(cur, "dreams",
+                      ("id", "user_id", "text", "interpretation", "emotion_primary",
+                       "emotion_secondary", "confidence_primary", "confidence_secondary",
+                       "sleep_quality", "created_at"), dreams)
+                _copy(cur, "dream_symbols", ("dream_id", "user_id", "symbol"), symbols)
+                done += size
+                print(f"  {done}/{n_dreams} dreams", file=sys.stderr)
+            cur.execute("SELECT setval(pg_get_serial_sequence('dreams', 'id'), (SELECT MAX(id) FROM dreams))")
+            cur.execute("ANALYZE users; ANALYZE dreams; ANALYZE dream_symbols;")
+        conn.commit()
+    return n_users
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed synthetic benchmark data.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="1k")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    users = seed(args.scale, args.seed)
+    print(f"Seeded {users} users and {SCALES[args.scale]} dreams.")
@@ -0,0 +1,111 @@
+"""Cold-start profile for the serverless entry point (api/index.py).
+
+    python coldstart.py                     # import report + first-request latency
+    python coldstart.py --runs 5 --top 30
+    python coldstart.py --max-import-ms 400 --max-first-request-ms 250
+
+Every run is a fresh interpreter, like a Vercel cold start: it imports
+api/index.py under -X importtime, then serves one request through the Flask
+test client. The report lists the modules with the largest cumulative import
+time (median over runs). With --max-* bounds set the script exits 1 when a
+median goes over; tests/test_coldstart.py runs the same check under pytest.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import api.index
+imported = time.perf_counter()
+response = api.index.app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "first_request_ms": (served - imported) * 1000,
+    "status": response.status_code,
+}))
+"""
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def run_once(path):
+    """One cold start; returns (timings dict, {module: (self_us, cumulative_us, depth)})."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD, path],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"cold start failed:\n{proc.stderr[-2000:]}")
+    modules = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return json.loads(proc.stdout.strip().splitlines()[-1]), modules
+
+
+def profile(path="/login", runs=3):
+    results = [run_once(path) for _ in range(runs)]
+    timings = {
+        key: statistics.median(r[0][key] for r in results)
+        for key in ("import_ms", "first_request_ms")
+    }
+    timings["status"] = results[-1][0]["status"]
+    modules = {}
+    for name in results[-1][1]:
+        samples = [r[1][name] for r in results if name in r[1]]
+        modules[name] = (statistics.median(s[0] for s in samples),
+                         statistics.median(s[1] for s in samples),
+                         samples[0][2])
+    return timings, modules
+
+
+def report(timings, modules, path, top=20):
+    print(f"{'cumulative':>11} {'self':>9}  module")
+    ranked = sorted(modules.items(), key=lambda kv: kv[1][1], reverse=True)
+    for name, (self_us, cumulative_us, depth) in ranked[:top]:
+        print(f"{cumulative_us / 1000:>9.1f}ms {self_us / 1000:>7.1f}ms  "
+              f"{'  ' * depth}{name}")
+    print()
+    print(f"import api.index      {timings['import_ms']:>8.1f}ms")
+    print(f"first GET {path:<11} {timings['first_request_ms']:>8.1f}ms  "
+          f"(status {timings['status']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile serverless cold starts")
+    parser.add_argument("--path", default="/login",
+                        help="request served after import (default: /login)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--max-import-ms", type=float)
+    parser.add_argument("--max-first-request-ms", type=float)
+    args = parser.parse_args()
+
+    timings, modules = profile(args.path, args.runs)
+    report(timings, modules, args.path, args.top)
+
+    failed = False
+    for key, bound in (("import_ms", args.max_import_ms),
+                       ("first_request_ms", args.max_first_request_ms)):
+        if bound is not None and timings[key] > bound:
+            print(f"FAIL: {key} {timings[key]:.1f} > {bound:.1f}")
+            failed = True
+    if timings["status"] >= 500:
+        print(f"FAIL: first request returned {timings['status']}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
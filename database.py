@@ -1,17 +1,209 @@
+import itertools
 import os
+import threading
+import time
 import psycopg2
 import psycopg2.extras
-from werkzeug.security import generate_password_hash, check_password_hash
+import passwords
 from datetime import datetime, timezone
+from flask import has_request_context, session
+import profiler
+from metrics import DB_CONNECT, DB_READS, add_timing, timed_db
+
+
+_profiling_cursors = {}
+
+
+def _profiling_cursor(base):
+    """Subclass of a cursor class that logs each query to the active profile."""
+    if base not in _profiling_cursors:
+        def execute(self, query, vars=None):
+            start = time.perf_counter()
+            try:
+                return base.execute(self, query, vars)
+            finally:
+                profile = profiler.current()
+                if profile is not None:
+                    sql = query if isinstance(query, str) else str(query)
+                    profile.log_query(sql, time.perf_counter() - start)
+        _profiling_cursors[base] = type(f"Profiling{base.__name__}", (base,), {"execute": execute})
+    return _profiling_cursors[base]
+
+
+class ProfilingConnection(psycopg2.extensions.connection):
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = _profiling_cursor(base)
+        return super().cursor(*args, **kwargs)
+
+
+def enable_gevent():
+    """Make psycopg2 yield to the gevent hub while waiting on the server.
+
+    Called from gunicorn.conf.py in gevent workers; sockets used by requests
+    are already cooperative there through gevent's monkey-patching.
+    """
+    from gevent.socket import wait_read, wait_write
+
+    def wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == psycopg2.extensions.POLL_OK:
+                break
+            elif state == psycopg2.extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == psycopg2.extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+    psycopg2.extensions.set_wait_callback(wait_callback)
+
+
+# Bump whenever init_db() gains a migration; databases already at this
+# version skip the DDL on cold start.
+SCHEMA_VERSION = 2
+
+_schema_ready = False
+_schema_lock = threading.Lock()
 
 
 def get_conn():
-    return psycopg2.connect(os.getenv("DATABASE_URL"), sslmode="require")
+    """Open a connection, bringing the schema up to date on first use."""
+    if not _schema_ready:
+        ensure_schema()
+    return _connect()
+
+
+def ensure_schema():
+    """Run init_db() at most once per process, and only if the database is behind."""
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with _connect() as conn:
+            with conn.cursor() as cur:
+                try:
+                    cur.execute("SELECT MAX(version) FROM schema_version")
+                    current = cur.fetchone()[0] or 0
+                except psycopg2.errors.UndefinedTable:
+                    conn.rollback()
+                    current = 0
+        if current < SCHEMA_VERSION:
+            init_db()
+        _schema_ready = True
+
+
+def _connect(url=None, **kwargs):
+    start = time.perf_counter()
+    kwargs.setdefault("sslmode", os.getenv("DATABASE_SSLMODE", "require"))
+    if profiler.current() is not None:
+        kwargs["connection_factory"] = ProfilingConnection
+    conn = psycopg2.connect(url or os.getenv("DATABASE_URL"), **kwargs)
+    elapsed = time.perf_counter() - start
+    DB_CONNECT.observe(elapsed)
+    add_timing("db.connect", elapsed)
+    return conn
+
+
+# ── Read replicas ──────────────────────────────────────────────────────────────
+# DATABASE_REPLICA_URLS is a comma-separated list of streaming replicas of
+# DATABASE_URL. Read-only helpers round-robin over the healthy ones; writes
+# always go to the primary. After a write the session remembers the
+# primary's WAL position for READ_YOUR_WRITES_SECONDS, and until then a
+# replica is only used once it has replayed that far.
+
+REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("DATABASE_REPLICA_CONNECT_TIMEOUT", "2"))
+REPLICA_RETRY_SECONDS = float(os.getenv("DATABASE_REPLICA_RETRY_SECONDS", "30"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("DATABASE_READ_YOUR_WRITES_SECONDS", "60"))
+
+
+class _Replica:
+    def __init__(self, url):
+        self.url = url
+        self.down_until = 0.0
+        self.failures = 0
+        self.reads = 0
+        self.lagging = 0
+
+
+_replicas = [_Replica(url) for url in REPLICA_URLS]
+_replica_turn = itertools.count()
+_process_lsn = None  # (lsn, expires) for writes made outside a request
+
+
+def _write_floor():
+    """WAL position this session's reads must see, or None."""
+    floor = session.get("db_lsn") if has_request_context() else _process_lsn
+    if floor and floor[1] > time.time():
+        return floor[0]
+    return None
 
 
+def _track_write(conn):
+    """Record the primary's WAL position after a commit, for read-your-writes."""
+    global _process_lsn
+    if not _replicas:
+        return
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_current_wal_lsn()::text")
+        floor = [cur.fetchone()[0], time.time() + READ_YOUR_WRITES_SECONDS]
+    if has_request_context():
+        session["db_lsn"] = floor
+    else:
+        _process_lsn = floor
+
+
+def _replayed(conn, lsn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, FALSE)", (lsn,))
+        return cur.fetchone()[0]
+
+
+def get_read_conn():
+    """Connection for a read-only helper: a healthy, caught-up replica if
+    there is one, otherwise the primary."""
+    if not _schema_ready:
+        ensure_schema()
+    floor = _write_floor()
+    for _ in range(len(_replicas)):
+        replica = _replicas[next(_replica_turn) % len(_replicas)]
+        if replica.down_until > time.monotonic():
+            continue
+        try:
+            conn = _connect(replica.url, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+        except psycopg2.OperationalError as e:
+            print(f"Replica unavailable, skipping it for {REPLICA_RETRY_SECONDS:.0f}s:", e)
+            replica.failures += 1
+            replica.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+            continue
+        if floor is None or _replayed(conn, floor):
+            replica.reads += 1
+            DB_READS.labels("replica").inc()
+            return conn
+        replica.lagging += 1
+        conn.close()
+    DB_READS.labels("primary").inc()
+    return get_conn()
+
+
+def replica_status():
+    now = time.monotonic()
+    return [{
+        "replica": i,
+        "healthy": r.down_until <= now,
+        "retry_in": round(max(0.0, r.down_until - now), 1),
+        "reads": r.reads,
+        "lagging": r.lagging,
+        "failures": r.failures,
+    } for i, r in enumerate(_replicas)]
+
+
+@timed_db
 def init_db():
     """Create all tables if they don't exist."""
-    with get_conn() as conn:
+    with _connect() as conn:
         with conn.cursor() as cur:
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -55,22 +247,57 @@ def init_db():
                 ALTER TABLE users ADD COLUMN IF NOT EXISTS is_admin BOOLEAN DEFAULT FALSE;
                 ALTER TABLE users ADD COLUMN IF NOT EXISTS is_blocked BOOLEAN DEFAULT FALSE;
             """)
+            # Migrate: per-user IANA timezone for day-based stats
+            cur.execute("""
+                ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone TEXT DEFAULT 'UTC';
+            """)
+            # Migrate: bumped on every dream write, keys per-user analytics caches
+            cur.execute("""
+                ALTER TABLE users ADD COLUMN IF NOT EXISTS dreams_version INTEGER DEFAULT 0;
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_dreams_user_created
+                    ON dreams (user_id, created_at DESC);
+            """)
+            # Migrate: tombstones — rows are hidden at once and purged in batches
+            cur.execute("""
+                ALTER TABLE users ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ DEFAULT NULL;
+                ALTER TABLE dreams ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ DEFAULT NULL;
+                CREATE INDEX IF NOT EXISTS idx_users_tombstoned
+                    ON users (id) WHERE deleted_at IS NOT NULL;
+                CREATE INDEX IF NOT EXISTS idx_dreams_tombstoned
+                    ON dreams (id) WHERE deleted_at IS NOT NULL;
+                CREATE INDEX IF NOT EXISTS idx_dream_symbols_dream ON dream_symbols (dream_id);
+                CREATE INDEX IF NOT EXISTS idx_dream_symbols_user ON dream_symbols (user_id);
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL);
+                DELETE FROM schema_version;
+                INSERT INTO schema_version (version) VALUES (%s);
+            """, (SCHEMA_VERSION,))
         conn.commit()
 
 
 # ── Users ──────────────────────────────────────────────────────────────────────
 
+@timed_db
 def create_user(username, password):
-    hashed = generate_password_hash(password)
+    """Insert a new user; returns False if the username is already taken."""
+    hashed = passwords.hash_password(password)
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "INSERT INTO users (username, password) VALUES (%s, %s)",
+                """INSERT INTO users (username, password) VALUES (%s, %s)
+                   ON CONFLICT (username) DO NOTHING RETURNING id""",
                 (username, hashed)
             )
+            created = cur.fetchone() is not None
         conn.commit()
+        _track_write(conn)
+    return created
 
 
+@timed_db
 def get_or_create_oauth_user(oauth_id: str, username: str, email: str):
     """Find existing user by oauth_id, or create a new one (no password)."""
     with get_conn() as conn:
@@ -83,7 +310,7 @@ def get_or_create_oauth_user(oauth_id: str, username: str, email: str):
 
             # 2. Try matching by email (user may have registered manually before)
             if email:
-                cur.execute("SELECT * FROM users WHERE email = %s", (email,))
+                cur.execute("SELECT * FROM users WHERE email = %s AND deleted_at IS NULL", (email,))
                 user = cur.fetchone()
                 if user:
                     # Attach oauth_id to existing account
@@ -92,50 +319,104 @@ def get_or_create_oauth_user(oauth_id: str, username: str, email: str):
                         (oauth_id, user["id"])
                     )
                     conn.commit()
+                    _track_write(conn)
                     cur.execute("SELECT * FROM users WHERE id = %s", (user["id"],))
                     return cur.fetchone()
 
-            # 3. Create new OAuth user — ensure unique username
-            base = username
-            suffix = 0
-            while True:
-                candidate = base if suffix == 0 else f"{base}{suffix}"
-                cur.execute("SELECT id FROM users WHERE username = %s", (candidate,))
-                if not cur.fetchone():
-                    break
-                suffix += 1
+            # 3. Create new OAuth user — first free of base, base1, base2, ...
+            #    found in one query; the first gap is at most one past the
+            #    number of usernames sharing the prefix.
+            cur.execute("""
+                SELECT c.candidate
+                FROM (
+                    SELECT %(base)s AS candidate, 0 AS n
+                    UNION ALL
+                    SELECT %(base)s || n, n
+                    FROM generate_series(1, (
+                        SELECT COUNT(*) FROM users
+                        WHERE left(username, length(%(base)s)) = %(base)s
+                    )) AS n
+                ) c
+                WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.username = c.candidate)
+                ORDER BY c.n
+                LIMIT 1
+            """, {"base": username})
+            candidate = cur.fetchone()["candidate"]
             cur.execute(
                 "INSERT INTO users (username, password, oauth_id, email) VALUES (%s, %s, %s, %s) RETURNING *",
                 (candidate, "", oauth_id, email)
             )
             new_user = cur.fetchone()
         conn.commit()
+        _track_write(conn)
     return new_user
 
 
+@timed_db
 def get_user(username):
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("SELECT * FROM users WHERE username = %s", (username,))
+            cur.execute("SELECT * FROM users WHERE username = %s AND deleted_at IS NULL", (username,))
             return cur.fetchone()
 
 
-def get_user_by_id(user_id):
+@timed_db
+def set_user_timezone(user_id, tz_name):
+    """Store the user's timezone; returns False if Postgres doesn't know it.
+
+    Every day-based query converts with AT TIME ZONE, so a name missing
+    from the server's tzdata would make them all fail for this user.
+    """
     with get_conn() as conn:
+        with conn.cursor() as cur:
+            try:
+                cur.execute("SELECT NOW() AT TIME ZONE %s", (tz_name,))
+            except psycopg2.errors.InvalidParameterValue:
+                conn.rollback()
+                return False
+            # Every day-based stat shifts with the timezone: bump the version
+            # so cached insights are recomputed
+            cur.execute(
+                """UPDATE users SET timezone=%s, dreams_version = dreams_version + 1
+                   WHERE id=%s AND timezone IS DISTINCT FROM %s AND deleted_at IS NULL""",
+                (tz_name, user_id, tz_name)
+            )
+        conn.commit()
+        _track_write(conn)
+    return True
+
+
+@timed_db
+def get_user_by_id(user_id):
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+            cur.execute("SELECT * FROM users WHERE id = %s AND deleted_at IS NULL", (user_id,))
             return cur.fetchone()
 
 
+@timed_db
 def verify_password(username, password):
     user = get_user(username)
-    if user and check_password_hash(user["password"], password):
+    if user and passwords.check_password(user["password"], password):
+        if passwords.needs_rehash(user["password"]):
+            # Upgrade hashes made with older parameters while we have the password
+            set_password_hash(user["id"], passwords.hash_password(password))
         return user
     return None
 
 
+@timed_db
+def set_password_hash(user_id, hashed):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE users SET password=%s WHERE id=%s", (hashed, user_id))
+        conn.commit()
+        _track_write(conn)
+
+
 # ── Dreams ─────────────────────────────────────────────────────────────────────
 
+@timed_db
 def save_dream(user_id, text, interpretation, emotion_primary,
                emotion_secondary, confidence_primary, confidence_secondary,
                sleep_quality=None, symbols=None):
@@ -146,42 +427,57 @@ def save_dream(user_id, text, interpretation, emotion_primary,
                     (user_id, text, interpretation, emotion_primary,
                      emotion_secondary, confidence_primary, confidence_secondary,
                      sleep_quality)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+                SELECT id, %s,%s,%s,%s,%s,%s,%s
+                FROM users WHERE id=%s AND deleted_at IS NULL
                 RETURNING id
-            """, (user_id, text, interpretation, emotion_primary,
+            """, (text, interpretation, emotion_primary,
                   emotion_secondary, confidence_primary, confidence_secondary,
-                  sleep_quality))
-            dream_id = cur.fetchone()[0]
-            if symbols:
-                for sym in symbols:
-                    cur.execute(
-                        "INSERT INTO dream_symbols (dream_id, user_id, symbol) VALUES (%s,%s,%s)",
-                        (dream_id, user_id, sym.lower().strip())
-                    )
+                  sleep_quality, user_id))
+            # No row: the account was deleted while this session was still open
+            row = cur.fetchone()
+            dream_id = row[0] if row else None
+            if row:
+                cur.execute(
+                    "UPDATE users SET dreams_version = dreams_version + 1 WHERE id=%s",
+                    (user_id,)
+                )
+                if symbols:
+                    for sym in symbols:
+                        cur.execute(
+                            "INSERT INTO dream_symbols (dream_id, user_id, symbol) VALUES (%s,%s,%s)",
+                            (dream_id, user_id, sym.lower().strip())
+                        )
         conn.commit()
+        _track_write(conn)
     return dream_id
 
 
+@timed_db
 def get_dreams(user_id, limit=100):
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
-                SELECT * FROM dreams WHERE user_id = %s
-                ORDER BY created_at DESC LIMIT %s
+                SELECT d.* FROM dreams d
+                JOIN users u ON u.id = d.user_id AND u.deleted_at IS NULL
+                WHERE d.user_id = %s AND d.deleted_at IS NULL
+                ORDER BY d.created_at DESC LIMIT %s
             """, (user_id, limit))
             return cur.fetchall()
 
 
+@timed_db
 def get_dream(dream_id, user_id):
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(
-                "SELECT * FROM dreams WHERE id = %s AND user_id = %s",
-                (dream_id, user_id)
-            )
+            cur.execute("""
+                SELECT d.* FROM dreams d
+                JOIN users u ON u.id = d.user_id AND u.deleted_at IS NULL
+                WHERE d.id = %s AND d.user_id = %s AND d.deleted_at IS NULL
+            """, (dream_id, user_id))
             return cur.fetchone()
 
 
+@timed_db
 def update_dream(dream_id, user_id, text, interpretation, emotion_primary,
                  emotion_secondary, confidence_primary, confidence_secondary,
                  sleep_quality=None, symbols=None):
@@ -192,107 +488,290 @@ def update_dream(dream_id, user_id, text, interpretation, emotion_primary,
                     text=%s, interpretation=%s, emotion_primary=%s,
                     emotion_secondary=%s, confidence_primary=%s,
                     confidence_secondary=%s, sleep_quality=%s
-                WHERE id=%s AND user_id=%s
+                WHERE id=%s AND user_id=%s AND deleted_at IS NULL
+                  AND user_id IN (SELECT id FROM users WHERE deleted_at IS NULL)
+                RETURNING id
             """, (text, interpretation, emotion_primary, emotion_secondary,
                   confidence_primary, confidence_secondary, sleep_quality,
                   dream_id, user_id))
-            # Replace symbols
-            cur.execute("DELETE FROM dream_symbols WHERE dream_id=%s", (dream_id,))
-            if symbols:
-                for sym in symbols:
-                    cur.execute(
-                        "INSERT INTO dream_symbols (dream_id, user_id, symbol) VALUES (%s,%s,%s)",
-                        (dream_id, user_id, sym.lower().strip())
-                    )
+            # Deleted (or purged) while the AI ran, or not this user's dream:
+            # leave its symbols alone
+            updated = cur.fetchone() is not None
+            if updated:
+                cur.execute(
+                    "UPDATE users SET dreams_version = dreams_version + 1 WHERE id=%s",
+                    (user_id,)
+                )
+                # Replace symbols
+                cur.execute("DELETE FROM dream_symbols WHERE dream_id=%s", (dream_id,))
+                if symbols:
+                    for sym in symbols:
+                        cur.execute(
+                            "INSERT INTO dream_symbols (dream_id, user_id, symbol) VALUES (%s,%s,%s)",
+                            (dream_id, user_id, sym.lower().strip())
+                        )
+        conn.commit()
+        _track_write(conn)
+    return updated
+
+
+@timed_db
+def get_fallback_dreams(fallback_interpretation, after_id=0, limit=100):
+    """Live dreams saved while the AI was unavailable, by ascending id.
+
+    That is: the canned interpretation, the zero-confidence neutral emotion,
+    or no symbols at all. Page with after_id = the last id returned.
+    """
+    with get_read_conn() as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("""
+                SELECT * FROM (
+                    SELECT d.id, d.user_id, d.text,
+                           d.interpretation = %(fallback)s AS needs_interpretation,
+                           (d.emotion_primary = 'neutral'
+                            AND COALESCE(d.confidence_primary, 0) = 0) AS needs_emotion,
+                           NOT EXISTS (SELECT 1 FROM dream_symbols s
+                                       WHERE s.dream_id = d.id) AS needs_symbols
+                    FROM dreams d
+                    JOIN users u ON u.id = d.user_id
+                    WHERE d.id > %(after)s
+                      AND d.deleted_at IS NULL AND u.deleted_at IS NULL
+                ) c
+                WHERE needs_interpretation OR needs_emotion OR needs_symbols
+                ORDER BY id
+                LIMIT %(limit)s
+            """, {"fallback": fallback_interpretation, "after": after_id, "limit": limit})
+            return cur.fetchall()
+
+
+@timed_db
+def update_dream_analysis(dream_id, interpretation=None, emotion=None, symbols=None):
+    """Fill in AI output for an existing dream; None leaves that part as it is."""
+    emotion = emotion or {}
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE dreams SET
+                    interpretation = COALESCE(%s, interpretation),
+                    emotion_primary = COALESCE(%s, emotion_primary),
+                    emotion_secondary = COALESCE(%s, emotion_secondary),
+                    confidence_primary = COALESCE(%s, confidence_primary),
+                    confidence_secondary = COALESCE(%s, confidence_secondary)
+                WHERE id=%s AND deleted_at IS NULL
+                RETURNING user_id
+            """, (interpretation, emotion.get("primary"), emotion.get("secondary"),
+                  emotion.get("confidence_primary"), emotion.get("confidence_secondary"),
+                  dream_id))
+            row = cur.fetchone()
+            if row:
+                if symbols:
+                    cur.execute("DELETE FROM dream_symbols WHERE dream_id=%s", (dream_id,))
+                    for sym in symbols:
+                        cur.execute(
+                            "INSERT INTO dream_symbols (dream_id, user_id, symbol) VALUES (%s,%s,%s)",
+                            (dream_id, row[0], sym.lower().strip())
+                        )
+                cur.execute(
+                    "UPDATE users SET dreams_version = dreams_version + 1 WHERE id=%s",
+                    (row[0],)
+                )
         conn.commit()
+        _track_write(conn)
+    return row is not None
 
 
+@timed_db
 def delete_dream(dream_id, user_id):
+    """Tombstone a dream; purge_batch() removes the row later."""
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "DELETE FROM dreams WHERE id=%s AND user_id=%s",
+                """UPDATE dreams SET deleted_at = NOW()
+                   WHERE id=%s AND user_id=%s AND deleted_at IS NULL
+                     AND user_id IN (SELECT id FROM users WHERE deleted_at IS NULL)
+                   RETURNING id""",
                 (dream_id, user_id)
             )
+            deleted = cur.fetchone() is not None
+            if deleted:
+                # A handful of rows at most; dropping them now hides the symbols
+                cur.execute("DELETE FROM dream_symbols WHERE dream_id=%s", (dream_id,))
+                cur.execute(
+                    "UPDATE users SET dreams_version = dreams_version + 1 WHERE id=%s",
+                    (user_id,)
+                )
         conn.commit()
+        _track_write(conn)
+    return deleted
 
 
 # ── Analytics ──────────────────────────────────────────────────────────────────
 
+@timed_db
 def get_emotion_counts(user_id):
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
-                SELECT emotion_primary AS emotion, COUNT(*) AS count
-                FROM dreams WHERE user_id=%s AND emotion_primary IS NOT NULL
-                GROUP BY emotion_primary ORDER BY count DESC
+                SELECT d.emotion_primary AS emotion, COUNT(*) AS count
+                FROM dreams d
+                JOIN users u ON u.id = d.user_id AND u.deleted_at IS NULL
+                WHERE d.user_id=%s AND d.emotion_primary IS NOT NULL AND d.deleted_at IS NULL
+                GROUP BY d.emotion_primary ORDER BY count DESC
             """, (user_id,))
             return cur.fetchall()
 
 
-def get_streak(user_id):
-    """Return current consecutive-day streak."""
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT DISTINCT DATE(created_at AT TIME ZONE 'UTC') AS day
-                FROM dreams WHERE user_id=%s
-                ORDER BY day DESC
-            """, (user_id,))
-            days = [r[0] for r in cur.fetchall()]
-
-    if not days:
-        return 0
-
-    streak = 1
-    for i in range(1, len(days)):
-        if (days[i - 1] - days[i]).days == 1:
-            streak += 1
-        else:
-            break
-    return streak
+@timed_db
+def get_streaks(user_id):
+    """Return {current, longest} consecutive-day streaks in the user's timezone.
 
-
-def get_mood_calendar(user_id):
-    """Return list of {day, emotion} for the last 90 days."""
-    with get_conn() as conn:
+    Days are grouped into islands of consecutive dates in SQL (date minus
+    row number is constant within a run). The current streak is the island
+    ending today or yesterday — it isn't broken until today is over.
+    """
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
+                WITH tz AS (
+                    SELECT COALESCE(timezone, 'UTC') AS name FROM users
+                    WHERE id = %(uid)s AND deleted_at IS NULL
+                ),
+                days AS (
+                    SELECT DISTINCT (d.created_at AT TIME ZONE tz.name)::date AS day
+                    FROM dreams d, tz
+                    WHERE d.user_id = %(uid)s AND d.deleted_at IS NULL
+                ),
+                islands AS (
+                    SELECT MAX(day) AS end_day, COUNT(*) AS len
+                    FROM (
+                        SELECT day, day - (ROW_NUMBER() OVER (ORDER BY day))::int AS grp
+                        FROM days
+                    ) g
+                    GROUP BY grp
+                )
                 SELECT
-                    DATE(created_at AT TIME ZONE 'UTC') AS day,
-                    emotion_primary AS emotion
-                FROM dreams
-                WHERE user_id=%s
-                  AND created_at >= NOW() - INTERVAL '90 days'
-                ORDER BY day ASC
-            """, (user_id,))
-            return cur.fetchall()
+                    COALESCE(MAX(len) FILTER (
+                        WHERE end_day >= (NOW() AT TIME ZONE (SELECT name FROM tz))::date - 1
+                    ), 0) AS current,
+                    COALESCE(MAX(len), 0) AS longest
+                FROM islands
+            """, {"uid": user_id})
+            return cur.fetchone()
 
 
-def get_sleep_emotion_data(user_id):
-    """Return list of {sleep_quality, emotion_primary} where sleep_quality is set."""
-    with get_conn() as conn:
+@timed_db
+def get_dream_days(user_id, limit=90):
+    """Return the distinct local days (date objects, ascending) of the
+    user's `limit` most recent dreams, in their timezone."""
+    with get_read_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                WITH tz AS (
+                    SELECT COALESCE(timezone, 'UTC') AS name FROM users
+                    WHERE id = %(uid)s AND deleted_at IS NULL
+                )
+                SELECT DISTINCT (d.created_at AT TIME ZONE tz.name)::date AS day
+                FROM (
+                    SELECT created_at FROM dreams
+                    WHERE user_id = %(uid)s AND deleted_at IS NULL
+                    ORDER BY created_at DESC
+                    LIMIT %(limit)s
+                ) d, tz
+                ORDER BY day
+            """, {"uid": user_id, "limit": limit})
+            return [row[0] for row in cur.fetchall()]
+
+
+@timed_db
+def get_mood_calendar(user_id):
+    """Return [{day, emotion}] for the last 90 days, one row per local day.
+
+    emotion is the day's most frequent primary emotion (ties go to the most
+    recent dream), computed server-side in the user's timezone.
+    """
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
-                SELECT sleep_quality, emotion_primary,
-                       DATE(created_at AT TIME ZONE 'UTC') AS day
-                FROM dreams
-                WHERE user_id=%s AND sleep_quality IS NOT NULL
-                ORDER BY created_at DESC
-                LIMIT 60
-            """, (user_id,))
+                WITH tz AS (
+                    SELECT COALESCE(timezone, 'UTC') AS name FROM users
+                    WHERE id = %(uid)s AND deleted_at IS NULL
+                )
+                SELECT DISTINCT ON (day) day, emotion
+                FROM (
+                    SELECT (d.created_at AT TIME ZONE tz.name)::date AS day,
+                           d.emotion_primary AS emotion,
+                           COUNT(*) AS n,
+                           MAX(d.created_at) AS latest
+                    FROM dreams d, tz
+                    WHERE d.user_id = %(uid)s
+                      AND d.deleted_at IS NULL
+                      AND d.emotion_primary IS NOT NULL
+                      AND d.created_at >= NOW() - INTERVAL '90 days'
+                    GROUP BY 1, 2
+                ) per_emotion
+                ORDER BY day ASC, n DESC, latest DESC
+            """, {"uid": user_id})
             return cur.fetchall()
 
 
+@timed_db
+def get_dreams_version(user_id):
+    """Counter bumped on every write to the user's dreams."""
+    with get_read_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT dreams_version FROM users WHERE id=%s AND deleted_at IS NULL",
+                (user_id,)
+            )
+            row = cur.fetchone()
+            return row[0] if row else None
+
+
+@timed_db
+def get_analytics_series(user_id):
+    """Return (dreams_version, rows): the user's full history as
+    (local_day, sleep_quality, emotion, confidence) tuples, and the version
+    it corresponds to.
+
+    local_day is days since 1970-01-01 in the user's timezone; rows are in
+    chronological order and carry no text, so even long histories are small.
+    Both come from one statement, so one snapshot: on replicas replaying at
+    different speeds the version can never be newer than the rows.
+    """
+    with get_read_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                WITH u AS (
+                    SELECT dreams_version, COALESCE(timezone, 'UTC') AS tz
+                    FROM users WHERE id = %(uid)s AND deleted_at IS NULL
+                )
+                SELECT u.dreams_version,
+                       ((d.created_at AT TIME ZONE u.tz)::date - DATE '1970-01-01') AS day,
+                       d.sleep_quality,
+                       COALESCE(d.emotion_primary, 'neutral'),
+                       COALESCE(d.confidence_primary, 0)
+                FROM u LEFT JOIN dreams d
+                  ON d.user_id = %(uid)s AND d.deleted_at IS NULL
+                ORDER BY d.created_at
+            """, {"uid": user_id})
+            rows = cur.fetchall()
+    if not rows:
+        return None, []
+    # A user with no dreams still gets one row, carrying just the version
+    return rows[0][0], [row[1:] for row in rows if row[1] is not None]
+
+
+@timed_db
 def get_top_symbols(user_id, limit=20):
     """Return top recurring dream symbols for a user."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
-                SELECT symbol, COUNT(*) AS count
-                FROM dream_symbols
-                WHERE user_id=%s
-                GROUP BY symbol
+                SELECT s.symbol, COUNT(*) AS count
+                FROM dream_symbols s
+                JOIN users u ON u.id = s.user_id AND u.deleted_at IS NULL
+                WHERE s.user_id=%s
+                GROUP BY s.symbol
                 ORDER BY count DESC
                 LIMIT %s
             """, (user_id, limit))
@@ -301,92 +780,202 @@ def get_top_symbols(user_id, limit=20):
 
 # ── Admin ──────────────────────────────────────────────────────────────────────
 
+@timed_db
 def get_all_users():
     """Return all users with dream count, ordered by join date."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
                 SELECT u.id, u.username, u.email, u.created_at,
                        u.is_admin, u.is_blocked, u.oauth_id,
                        COUNT(d.id) AS dream_count
                 FROM users u
-                LEFT JOIN dreams d ON d.user_id = u.id
+                LEFT JOIN dreams d ON d.user_id = u.id AND d.deleted_at IS NULL
+                WHERE u.deleted_at IS NULL
                 GROUP BY u.id
                 ORDER BY u.created_at DESC
             """)
             return cur.fetchall()
 
 
+@timed_db
 def get_all_dreams_admin(limit=200):
     """Return all dreams across all users for admin view."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
                 SELECT d.*, u.username
                 FROM dreams d
                 JOIN users u ON u.id = d.user_id
+                WHERE d.deleted_at IS NULL AND u.deleted_at IS NULL
                 ORDER BY d.created_at DESC
                 LIMIT %s
             """, (limit,))
             return cur.fetchall()
 
 
+@timed_db
 def get_user_dreams_admin(user_id):
     """Return all dreams for a specific user (admin use)."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
                 SELECT d.*, u.username
                 FROM dreams d
                 JOIN users u ON u.id = d.user_id
-                WHERE d.user_id = %s
+                WHERE d.user_id = %s AND d.deleted_at IS NULL AND u.deleted_at IS NULL
                 ORDER BY d.created_at DESC
             """, (user_id,))
             return cur.fetchall()
 
 
+@timed_db
 def admin_delete_dream(dream_id):
-    """Delete any dream (admin, no user_id check)."""
+    """Tombstone any dream (admin, no user_id check)."""
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("DELETE FROM dreams WHERE id=%s", (dream_id,))
+            cur.execute(
+                """UPDATE dreams SET deleted_at = NOW()
+                   WHERE id=%s AND deleted_at IS NULL RETURNING user_id""",
+                (dream_id,)
+            )
+            row = cur.fetchone()
+            if row:
+                cur.execute("DELETE FROM dream_symbols WHERE dream_id=%s", (dream_id,))
+                cur.execute(
+                    "UPDATE users SET dreams_version = dreams_version + 1 WHERE id=%s",
+                    (row[0],)
+                )
         conn.commit()
+        _track_write(conn)
 
 
+@timed_db
 def admin_delete_user(user_id):
-    """Delete a user and all their data (cascade)."""
+    """Tombstone a user; their dreams and symbols are purged in batches later.
+
+    oauth_id is released straight away so the same account can sign up again.
+    """
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("DELETE FROM users WHERE id=%s", (user_id,))
+            cur.execute(
+                """UPDATE users SET deleted_at = NOW(), oauth_id = NULL
+                   WHERE id=%s AND deleted_at IS NULL""",
+                (user_id,)
+            )
         conn.commit()
+        _track_write(conn)
 
 
+@timed_db
 def set_user_blocked(user_id, blocked: bool):
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("UPDATE users SET is_blocked=%s WHERE id=%s", (blocked, user_id))
         conn.commit()
+        _track_write(conn)
 
 
+@timed_db
 def set_user_admin(user_id, is_admin: bool):
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("UPDATE users SET is_admin=%s WHERE id=%s", (is_admin, user_id))
         conn.commit()
+        _track_write(conn)
 
 
+@timed_db
 def get_admin_stats():
     """Global stats for admin dashboard."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
             cur.execute("""
                 SELECT
-                    (SELECT COUNT(*) FROM users) AS total_users,
-                    (SELECT COUNT(*) FROM users WHERE is_blocked=TRUE) AS blocked_users,
-                    (SELECT COUNT(*) FROM dreams) AS total_dreams,
-                    (SELECT COUNT(*) FROM dreams
-                     WHERE created_at >= NOW() - INTERVAL '24 hours') AS dreams_today,
+                    (SELECT COUNT(*) FROM users WHERE deleted_at IS NULL) AS total_users,
+                    (SELECT COUNT(*) FROM users
+                     WHERE is_blocked=TRUE AND deleted_at IS NULL) AS blocked_users,
+                    (SELECT COUNT(*) FROM dreams d JOIN users u ON u.id = d.user_id
+                     WHERE d.deleted_at IS NULL AND u.deleted_at IS NULL) AS total_dreams,
+                    (SELECT COUNT(*) FROM dreams d JOIN users u ON u.id = d.user_id
+                     WHERE d.deleted_at IS NULL AND u.deleted_at IS NULL
+                       AND d.created_at >= NOW() - INTERVAL '24 hours') AS dreams_today,
                     (SELECT COUNT(*) FROM users
-                     WHERE created_at >= NOW() - INTERVAL '7 days') AS new_users_week
+                     WHERE created_at >= NOW() - INTERVAL '7 days'
+                       AND deleted_at IS NULL) AS new_users_week
             """)
             return cur.fetchone()
+
+
+# ── Purging ────────────────────────────────────────────────────────────────────
+# Deletes only set deleted_at; purge_batch() removes the rows afterwards,
+# children before parents and at most `limit` rows per transaction, so even
+# a user with years of dreams never becomes one long cascading DELETE.
+
+_PURGE_STEPS = (
+    ("dream_symbols", """
+        DELETE FROM dream_symbols WHERE id IN (
+            SELECT s.id FROM dream_symbols s
+            JOIN users u ON u.id = s.user_id
+            WHERE u.deleted_at IS NOT NULL
+            LIMIT %(limit)s FOR UPDATE OF s SKIP LOCKED)
+    """),
+    ("dreams", """
+        DELETE FROM dreams WHERE id IN (
+            SELECT d.id FROM dreams d
+            JOIN users u ON u.id = d.user_id
+            WHERE u.deleted_at IS NOT NULL
+            LIMIT %(limit)s FOR UPDATE OF d SKIP LOCKED)
+    """),
+    ("dreams", """
+        DELETE FROM dreams WHERE id IN (
+            SELECT id FROM dreams
+            WHERE deleted_at IS NOT NULL
+            LIMIT %(limit)s FOR UPDATE SKIP LOCKED)
+    """),
+    ("users", """
+        DELETE FROM users WHERE id IN (
+            SELECT u.id FROM users u
+            WHERE u.deleted_at IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM dreams d WHERE d.user_id = u.id)
+              AND NOT EXISTS (SELECT 1 FROM dream_symbols s WHERE s.user_id = u.id)
+            LIMIT %(limit)s FOR UPDATE SKIP LOCKED)
+    """),
+)
+
+
+@timed_db
+def purge_batch(limit=1000):
+    """Delete up to `limit` tombstoned rows in one transaction.
+
+    Returns (table, rows deleted), or (None, 0) once nothing is left.
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            for table, sql in _PURGE_STEPS:
+                cur.execute(sql, {"limit": limit})
+                if cur.rowcount:
+                    conn.commit()
+                    return table, cur.rowcount
+        conn.commit()
+    return None, 0
+
+
+@timed_db
+def get_purge_backlog():
+    """Rows still waiting to be purged, by table."""
+    with get_conn() as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("""
+                WITH gone AS (SELECT id FROM users WHERE deleted_at IS NOT NULL)
+                SELECT
+                    (SELECT COUNT(*) FROM dream_symbols
+                     WHERE user_id IN (SELECT id FROM gone)) AS dream_symbols,
+                    (SELECT COUNT(*) FROM dreams
+                     WHERE user_id IN (SELECT id FROM gone))
+                    + (SELECT COUNT(*) FROM dreams
+                       WHERE deleted_at IS NOT NULL
+                         AND user_id NOT IN (SELECT id FROM gone)) AS dreams,
+                    (SELECT COUNT(*) FROM gone) AS users
+            """)
+            return dict(cur.fetchone())
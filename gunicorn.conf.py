@@ -0,0 +1,27 @@
+import os
+
+# gevent serves many concurrent, I/O-bound requests per process instead of
+# one. It is also what makes the AI fair-share scheduler work: its queues are
+# per process, and a sync worker never has more than one request waiting in
+# them. GUNICORN_WORKER_CLASS=sync is still supported, but without fair sharing.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+
+def post_worker_init(worker):
+    if "gevent" in worker.cfg.worker_class_str:
+        import database
+        database.enable_gevent()
+    # Load the local GGUF model before the first request instead of during it
+    if os.getenv("LOCAL_LLM_PRELOAD", "").lower() in ("1", "true", "yes"):
+        import app
+        ai = app.get_ai()
+        if ai.local is not None:
+            ai.local.warm()
+
+
+def child_exit(server, worker):
+    # Drop a dead worker's live gauges from the shared metrics directory
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
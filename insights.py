@@ -0,0 +1,149 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import database as db
+import metrics
+
+_cache = OrderedDict()  # user_id -> (version, stats)
+_cache_lock = threading.Lock()
+CACHE_SIZE = 512
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def get_insights(user_id):
+    """Long-range sleep/emotion statistics for a user, cached per data version.
+
+    A cache hit costs one indexed lookup of users.dreams_version; a miss
+    loads the full history as columns and recomputes everything.
+    """
+    version = db.get_dreams_version(user_id)
+    with _cache_lock:
+        cached = _cache.get(user_id)
+        if cached and cached[0] == version:
+            _cache.move_to_end(user_id)
+            metrics.record_cache("insights", True)
+            return cached[1]
+    metrics.record_cache("insights", False)
+
+    # Cache under the version read with the rows, not the one above: the two
+    # reads may have gone to replicas at different replay positions.
+    version, rows = db.get_analytics_series(user_id)
+    stats = compute(*load_series(rows))
+    with _cache_lock:
+        cached = _cache.get(user_id)
+        if cached is None or (version or 0) >= (cached[0] or 0):
+            _cache[user_id] = (version, stats)
+        _cache.move_to_end(user_id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return stats
+
+
+def load_series(rows):
+    """Return (local_days, sleep, emotion_codes, labels, confidence) arrays."""
+    n = len(rows)
+    if n == 0:
+        return (np.empty(0, np.int32), np.empty(0, np.float32),
+                np.empty(0, np.intp), [], np.empty(0, np.float32))
+    day_col, sleep_col, emotion_col, conf_col = zip(*rows)
+    days = np.fromiter(day_col, np.int32, n)       # days since epoch, user's local time
+    sleep = np.array(sleep_col, dtype=np.float32)  # None -> NaN where unrated
+    confidence = np.fromiter(conf_col, np.float32, n)
+    labels, codes = np.unique(np.array(emotion_col, dtype=str), return_inverse=True)
+    return days, sleep, codes, labels.tolist(), confidence
+
+
+def compute(days, sleep, codes, labels, confidence, window=7):
+    n = len(days)
+    stats = {
+        "total": n,
+        "sleep_rated": 0,
+        "sleep_by_emotion": {},
+        "weekday_matrix": {"weekdays": WEEKDAYS, "emotions": [], "counts": []},
+        "rolling_sleep": {"start_day": None, "values": []},
+        "trend": None,
+        "emotion_confidence": {},
+    }
+    if n == 0:
+        return stats
+    k = len(labels)
+
+    # Emotion x weekday counts (epoch day 0 was a Thursday, weekday index 3)
+    weekday = (days + 3) % 7
+    matrix = np.bincount(codes * 7 + weekday, minlength=k * 7).reshape(k, 7)
+    stats["weekday_matrix"].update(emotions=labels, counts=matrix.tolist())
+    all_counts = matrix.sum(axis=1)
+    conf_sums = np.bincount(codes, weights=confidence, minlength=k)
+    stats["emotion_confidence"] = {
+        labels[j]: round(float(conf_sums[j] / all_counts[j]), 3)
+        for j in np.nonzero(all_counts)[0]
+    }
+
+    rated = ~np.isnan(sleep)
+    stats["sleep_rated"] = int(rated.sum())
+    if not rated.any():
+        return stats
+    s, c, d = sleep[rated].astype(np.float64), codes[rated], days[rated]
+
+    # Mean sleep per emotion with a 95% normal CI, plus the point-biserial
+    # correlation between "dreamt this emotion" and sleep, with a Fisher-z CI.
+    counts = np.bincount(c, minlength=k)
+    sums = np.bincount(c, weights=s, minlength=k)
+    sq_sums = np.bincount(c, weights=s * s, minlength=k)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = sums / counts
+        var = (sq_sums - counts * means ** 2) / (counts - 1)
+        half = 1.96 * np.sqrt(np.clip(var, 0, None) / counts)
+    m = len(s)
+    s_std = s.std()
+    for j in np.nonzero(counts)[0]:
+        r = lo = hi = None
+        p = counts[j] / m
+        if s_std > 0 and 0 < p < 1:
+            r = float((means[j] - s.mean()) / s_std * np.sqrt(p / (1 - p)))
+            r = max(-0.999999, min(0.999999, r))
+            if m > 3:
+                z, se = np.arctanh(r), 1 / np.sqrt(m - 3)
+                lo, hi = float(np.tanh(z - 1.96 * se)), float(np.tanh(z + 1.96 * se))
+        stats["sleep_by_emotion"][labels[j]] = {
+            "n": int(counts[j]),
+            "mean": round(float(means[j]), 2),
+            "ci_low": round(float(means[j] - half[j]), 2) if counts[j] > 1 else None,
+            "ci_high": round(float(means[j] + half[j]), 2) if counts[j] > 1 else None,
+            "r": None if r is None else round(r, 3),
+            "r_low": None if lo is None else round(lo, 3),
+            "r_high": None if hi is None else round(hi, 3),
+        }
+
+    # Rolling mean of daily-average sleep over a `window`-day calendar window
+    start = int(d.min())
+    span = int(d.max()) - start + 1
+    day_sum = np.bincount(d - start, weights=s, minlength=span)
+    day_cnt = np.bincount(d - start, minlength=span).astype(np.float64)
+    kernel = np.ones(window)
+    roll_sum = np.convolve(day_sum, kernel)[:span]
+    roll_cnt = np.convolve(day_cnt, kernel)[:span]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rolling = np.where(roll_cnt > 0, roll_sum / roll_cnt, np.nan)
+    values = np.round(rolling, 2).astype(object)
+    values[np.isnan(rolling)] = None
+    stats["rolling_sleep"] = {"start_day": start, "values": values.tolist()}
+
+    # Linear trend of sleep over time: slope per 30 days and its t-statistic
+    if m >= 3 and np.ptp(d) > 0:
+        x = (d - d.mean()).astype(np.float64)
+        slope = (x * (s - s.mean())).sum() / (x * x).sum()
+        resid = s - s.mean() - slope * x
+        se = np.sqrt((resid @ resid) / (m - 2) / (x * x).sum())
+        t = slope / se if se > 0 else float("inf") * np.sign(slope)
+        direction = "stable"
+        if abs(t) >= 2:
+            direction = "improving" if slope > 0 else "declining"
+        stats["trend"] = {
+            "slope_per_30d": round(float(slope * 30), 3),
+            "t": round(float(t), 2) if np.isfinite(t) else None,
+            "direction": direction,
+        }
+    return stats
@@ -0,0 +1,125 @@
+"""Local CPU generation backend: a small quantized instruct model via llama.cpp.
+
+    LOCAL_LLM_MODEL=models/qwen2.5-1.5b-instruct-q4_k_m.gguf
+    LOCAL_LLM_MODE=fallback     # or "primary"; "off" disables it
+
+Needs the optional llama-cpp-python package and a GGUF file. The model is
+loaded once per process on first use (or at worker start with
+LOCAL_LLM_PRELOAD=1) and reused. Weights are mmapped, so gunicorn workers
+share one copy in the page cache. A llama.cpp context decodes one sequence
+at a time, so calls are serialized on the model. At most LOCAL_LLM_QUEUE
+callers wait for it, and each waits no longer than LOCAL_LLM_TIMEOUT.
+Consecutive prompts share the system-prompt prefix, and llama.cpp reuses
+that part of the KV cache instead of evaluating it again. Under gevent
+workers loading and generation run on gevent's thread pool, so other
+requests keep being served while the model works.
+"""
+import os
+import sys
+import threading
+import time
+
+try:
+    import llama_cpp
+except ImportError:  # optional: remote-only without it
+    llama_cpp = None
+
+
+class LocalLLMBusy(Exception):
+    """Raised when too many calls are already waiting for the local model."""
+
+
+def _off_hub(fn, **kwargs):
+    """Call fn, on gevent's real-thread pool if threading is monkey-patched.
+
+    llama.cpp holds the CPU in C for seconds at a time; on a greenlet that
+    would stall every other request in the worker.
+    """
+    if "gevent" in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched("threading"):
+            import gevent
+            return gevent.get_hub().threadpool.spawn(fn, **kwargs).get()
+    return fn(**kwargs)
+
+
+class LocalLLM:
+    def __init__(self, model_path, threads=None, ctx=2048, queue=4, timeout=60.0):
+        self.model_path = model_path
+        self.threads = threads or os.cpu_count() or 1
+        self.ctx = ctx
+        self.timeout = timeout
+        self._llm = None
+        self._load_lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(queue + 1)
+        self._stats = {"calls": 0, "busy": 0, "prompt_tokens": 0,
+                       "completion_tokens": 0, "seconds": 0.0, "load_seconds": None}
+
+    @classmethod
+    def from_env(cls):
+        """The configured backend, or None when it's off or can't run here."""
+        path = os.getenv("LOCAL_LLM_MODEL", "")
+        if os.getenv("LOCAL_LLM_MODE", "fallback") == "off" or not path:
+            return None
+        if llama_cpp is None:
+            print("LOCAL_LLM_MODEL is set but llama-cpp-python is not installed")
+            return None
+        if not os.path.isfile(path):
+            print(f"LOCAL_LLM_MODEL not found: {path}")
+            return None
+        threads = int(os.getenv("LOCAL_LLM_THREADS", "0")) or None
+        return cls(path, threads=threads,
+                   ctx=int(os.getenv("LOCAL_LLM_CTX", "2048")),
+                   queue=int(os.getenv("LOCAL_LLM_QUEUE", "4")),
+                   timeout=float(os.getenv("LOCAL_LLM_TIMEOUT", "60")))
+
+    def warm(self):
+        """Load the model now instead of on the first request."""
+        if self._llm is None:
+            with self._load_lock:
+                if self._llm is None:
+                    start = time.perf_counter()
+                    self._llm = _off_hub(
+                        llama_cpp.Llama, model_path=self.model_path, n_ctx=self.ctx,
+                        n_threads=self.threads, n_batch=512, verbose=False,
+                    )
+                    self._stats["load_seconds"] = round(time.perf_counter() - start, 2)
+        return self._llm
+
+    def chat(self, messages, max_tokens=200, temperature=0.7):
+        """Generate a chat completion; returns the message text."""
+        if not self._slots.acquire(blocking=False):
+            self._stats["busy"] += 1
+            raise LocalLLMBusy("local model queue is full")
+        try:
+            llm = self.warm()
+            if not self._model_lock.acquire(timeout=self.timeout):
+                self._stats["busy"] += 1
+                raise LocalLLMBusy(f"waited {self.timeout:.0f}s for the local model")
+            try:
+                start = time.perf_counter()
+                out = _off_hub(
+                    llm.create_chat_completion, messages=messages,
+                    max_tokens=max_tokens, temperature=temperature,
+                )
+                elapsed = time.perf_counter() - start
+            finally:
+                self._model_lock.release()
+        finally:
+            self._slots.release()
+        usage = out.get("usage", {})
+        self._stats["calls"] += 1
+        self._stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        self._stats["completion_tokens"] += usage.get("completion_tokens", 0)
+        self._stats["seconds"] += elapsed
+        return out["choices"][0]["message"]["content"].strip()
+
+    def stats(self):
+        s = dict(self._stats)
+        tps = s["completion_tokens"] / s["seconds"] if s["seconds"] else 0.0
+        s.update(seconds=round(s["seconds"], 2), model=os.path.basename(self.model_path),
+                 threads=self.threads, loaded=self._llm is not None,
+                 tokens_per_sec=round(tps, 2),
+                 tokens_per_sec_per_core=round(tps / self.threads, 2))
+        return s
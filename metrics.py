@@ -0,0 +1,105 @@
+import os
+import time
+from functools import wraps
+
+from flask import g, has_request_context
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter,
+                               Gauge, Histogram, REGISTRY, generate_latest)
+
+# Under gunicorn, set PROMETHEUS_MULTIPROC_DIR so every worker writes its
+# samples to a shared directory and /metrics aggregates them.
+MULTIPROC = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by endpoint",
+    ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled",
+    multiprocess_mode="livesum",
+)
+AI_LATENCY = Histogram(
+    "dream_ai_duration_seconds", "DreamAI call latency by method",
+    ["method"], buckets=LATENCY_BUCKETS,
+)
+AI_QUEUE_WAIT = Histogram(
+    "dream_ai_queue_wait_seconds", "Time spent waiting for a fair-share AI slot",
+    ["tier"], buckets=LATENCY_BUCKETS,
+)
+AI_QUEUE_DEPTH = Gauge(
+    "dream_ai_queue_depth", "Analyses waiting for a fair-share AI slot",
+    ["tier"], multiprocess_mode="livesum",
+)
+DB_LATENCY = Histogram(
+    "db_query_duration_seconds", "database.py helper latency",
+    ["helper"], buckets=LATENCY_BUCKETS,
+)
+DB_CONNECT = Histogram(
+    "db_connect_duration_seconds", "Time to acquire a database connection",
+    buckets=LATENCY_BUCKETS,
+)
+DB_READS = Counter(
+    "db_read_connections_total", "Read-helper connections by target",
+    ["target"],
+)
+PURGED_ROWS = Counter(
+    "db_purged_rows_total", "Tombstoned rows removed by the purger",
+    ["table"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result",
+    ["cache", "result"],
+)
+
+
+def add_timing(stage: str, seconds: float):
+    """Accumulate a stage duration for this request's Server-Timing header."""
+    if has_request_context():
+        timings = g.setdefault("server_timing", {})
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def _timed(histogram, prefix):
+    def decorator(f):
+        child = histogram.labels(f.__name__)
+        stage = f"{prefix}.{f.__name__}"
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                child.observe(elapsed)
+                add_timing(stage, elapsed)
+        return wrapper
+    return decorator
+
+
+timed_db = _timed(DB_LATENCY, "db")
+timed_ai = _timed(AI_LATENCY, "ai")
+
+
+def server_timing_header(total: float) -> str:
+    parts = [f"{name};dur={secs * 1000:.1f}"
+             for name, secs in g.get("server_timing", {}).items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def render_latest():
+    """Return (body, content_type) for the /metrics endpoint."""
+    if MULTIPROC:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
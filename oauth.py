@@ -0,0 +1,194 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+GITHUB_TOKEN_URL = "https://github.com/login/oauth/access_token"
+GITHUB_API_URL = "https://api.github.com"
+
+# (connect, read) seconds for every provider call
+TIMEOUT = (float(os.getenv("OAUTH_CONNECT_TIMEOUT", "3")),
+           float(os.getenv("OAUTH_READ_TIMEOUT", "8")))
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="oauth")
+
+
+class OAuthError(Exception):
+    """The provider refused, timed out, or returned something we can't trust."""
+
+
+def _post(url, **kwargs):
+    try:
+        res = _session.post(url, timeout=TIMEOUT, **kwargs)
+        return res.json()
+    except (requests.RequestException, ValueError) as e:
+        raise OAuthError(f"POST {url} failed: {e}") from e
+
+
+def _get(url, **kwargs):
+    try:
+        res = _session.get(url, timeout=TIMEOUT, **kwargs)
+        res.raise_for_status()
+        return res.json()
+    except (requests.RequestException, ValueError) as e:
+        raise OAuthError(f"GET {url} failed: {e}") from e
+
+
+# ── Google ─────────────────────────────────────────────────────────────────────
+
+def _b64decode(segment):
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64int(segment):
+    return int.from_bytes(_b64decode(segment), "big")
+
+
+class _JWKSCache:
+    """Google's signing keys, cached for the max-age the endpoint advertises."""
+
+    def __init__(self, url):
+        self.url = url
+        self._keys = {}
+        self._expires = 0.0
+        self._fetched = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self, kid):
+        with self._lock:
+            now = time.monotonic()
+            # Unknown kid: Google may have rotated keys, but refetch at most once a minute
+            if now >= self._expires or (kid not in self._keys and now - self._fetched > 60):
+                self._refresh()
+            return self._keys.get(kid)
+
+    def _refresh(self):
+        try:
+            res = _session.get(self.url, timeout=TIMEOUT)
+            res.raise_for_status()
+            jwks = res.json()
+        except (requests.RequestException, ValueError) as e:
+            raise OAuthError(f"Could not fetch JWKS: {e}") from e
+        match = re.search(r"max-age=(\d+)", res.headers.get("Cache-Control", ""))
+        self._fetched = time.monotonic()
+        self._expires = time.monotonic() + (int(match.group(1)) if match else 3600)
+        self._keys = {
+            k["kid"]: (_b64int(k["n"]), _b64int(k["e"]))
+            for k in jwks.get("keys", []) if k.get("kty") == "RSA"
+        }
+
+
+_google_keys = _JWKSCache(GOOGLE_JWKS_URL)
+
+# DER prefix of a PKCS#1 v1.5 DigestInfo for SHA-256
+_SHA256_PREFIX = bytes.fromhex("3031300d060960864801650304020105000420")
+
+
+def _rs256_verify(signing_input, signature, n, e):
+    k = (n.bit_length() + 7) // 8
+    if len(signature) != k:
+        return False
+    em = pow(int.from_bytes(signature, "big"), e, n).to_bytes(k, "big")
+    digest_info = _SHA256_PREFIX + hashlib.sha256(signing_input).digest()
+    expected = b"\x00\x01" + b"\xff" * (k - len(digest_info) - 3) + b"\x00" + digest_info
+    return hmac.compare_digest(em, expected)
+
+
+def verify_google_id_token(id_token, client_id, leeway=60):
+    """Check an ID token's RS256 signature and claims locally; return its claims."""
+    try:
+        header_b64, payload_b64, sig_b64 = id_token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        claims = json.loads(_b64decode(payload_b64))
+        signature = _b64decode(sig_b64)
+    except (AttributeError, ValueError) as e:
+        raise OAuthError(f"Malformed ID token: {e}") from e
+    if header.get("alg") != "RS256":
+        raise OAuthError("Unexpected ID token algorithm")
+    key = _google_keys.get(header.get("kid"))
+    if key is None:
+        raise OAuthError("Unknown ID token signing key")
+    if not _rs256_verify(f"{header_b64}.{payload_b64}".encode(), signature, *key):
+        raise OAuthError("Bad ID token signature")
+    if claims.get("iss") not in GOOGLE_ISSUERS:
+        raise OAuthError("Bad ID token issuer")
+    if claims.get("aud") != client_id:
+        raise OAuthError("ID token is for another client")
+    if claims.get("exp", 0) < time.time() - leeway:
+        raise OAuthError("ID token expired")
+    return claims
+
+
+def google_login(code, redirect_uri):
+    """Exchange an auth code and return (oauth_id, username, email)."""
+    client_id = os.getenv("GOOGLE_CLIENT_ID")
+    token_data = _post(GOOGLE_TOKEN_URL, data={
+        "code":          code,
+        "client_id":     client_id,
+        "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
+        "redirect_uri":  redirect_uri,
+        "grant_type":    "authorization_code",
+    })
+    id_token = token_data.get("id_token")
+    if not id_token:
+        raise OAuthError("Failed to get ID token from Google.")
+    claims = verify_google_id_token(id_token, client_id)
+    email = claims.get("email", "") if claims.get("email_verified", False) in (True, "true") else ""
+    name = claims.get("name") or email.split("@")[0]
+    return f"google:{claims['sub']}", name, email
+
+
+# ── GitHub ─────────────────────────────────────────────────────────────────────
+
+def github_login(code, redirect_uri):
+    """Exchange an auth code and return (oauth_id, username, email).
+
+    The profile and email list are fetched concurrently over pooled
+    connections rather than one after the other.
+    """
+    token_data = _post(
+        GITHUB_TOKEN_URL,
+        headers={"Accept": "application/json"},
+        data={
+            "client_id":     os.getenv("GITHUB_CLIENT_ID"),
+            "client_secret": os.getenv("GITHUB_CLIENT_SECRET"),
+            "code":          code,
+            "redirect_uri":  redirect_uri,
+        },
+    )
+    access_token = token_data.get("access_token")
+    if not access_token:
+        raise OAuthError("Failed to get access token from GitHub.")
+
+    headers = {"Authorization": f"Bearer {access_token}",
+               "Accept": "application/vnd.github+json"}
+    profile_f = _pool.submit(_get, f"{GITHUB_API_URL}/user", headers=headers)
+    emails_f = _pool.submit(_get, f"{GITHUB_API_URL}/user/emails", headers=headers)
+    profile = profile_f.result()
+
+    # GitHub may not expose email publicly — fall back to the verified primary address
+    email = profile.get("email") or ""
+    if not email:
+        try:
+            emails = emails_f.result()
+        except OAuthError:
+            emails = []
+        email = next((e["email"] for e in emails
+                      if e.get("primary") and e.get("verified")), None) or ""
+
+    username = profile.get("login", f"gh_{profile.get('id')}")
+    return f"github:{profile.get('id')}", username, email
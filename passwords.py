@@ -0,0 +1,83 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+# Stored hashes made with a different method are upgraded on next login.
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pwhash")
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE)
+
+
+class HashPoolBusy(Exception):
+    """Raised when too many hashes are already running or queued."""
+
+
+def _gevent_patched():
+    if "gevent" not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched("threading")
+
+
+def _run(fn, *args):
+    """Run a CPU-heavy hash on the bounded pool, never on the request thread.
+
+    A hash that outlives HASH_TIMEOUT is reported as HashPoolBusy; it keeps
+    its slot until it actually finishes, so the bound still holds.
+    """
+    if not _slots.acquire(blocking=False):
+        raise HashPoolBusy("password hashing pool is saturated")
+    if _gevent_patched():
+        # Green threads would block the hub; use gevent's real-thread pool.
+        # rawlink callbacks run on the hub, where the (patched) semaphore lives.
+        import gevent
+        try:
+            job = gevent.get_hub().threadpool.spawn(fn, *args)
+        except BaseException:
+            _slots.release()
+            raise
+        job.rawlink(lambda _: _slots.release())
+        try:
+            return job.get(timeout=HASH_TIMEOUT)
+        except gevent.Timeout:
+            raise HashPoolBusy(f"password hash took over {HASH_TIMEOUT:g}s") from None
+    try:
+        job = _pool.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    job.add_done_callback(lambda _: _slots.release())
+    try:
+        return job.result(timeout=HASH_TIMEOUT)
+    except FutureTimeout:
+        raise HashPoolBusy(f"password hash took over {HASH_TIMEOUT:g}s") from None
+
+
+def hash_password(password: str) -> str:
+    return _run(generate_password_hash, password, HASH_METHOD)
+
+
+def check_password(pwhash: str, password: str) -> bool:
+    if not pwhash:
+        return False
+    return _run(check_password_hash, pwhash, password)
+
+
+@lru_cache(maxsize=1)
+def _method_prefix() -> str:
+    # Werkzeug expands short forms ("scrypt", "pbkdf2") to the full parameter
+    # string it stores, so compare against what it actually writes.
+    return _run(generate_password_hash, "", HASH_METHOD).split("$", 1)[0]
+
+
+def needs_rehash(pwhash: str) -> bool:
+    return bool(pwhash) and pwhash.split("$", 1)[0] != _method_prefix()
@@ -0,0 +1,194 @@
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "somnia-profiles"))
+# Profile every request and keep the ones slower than this; 0 disables.
+THRESHOLD = float(os.getenv("PROFILE_THRESHOLD_MS", "0")) / 1000
+INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+MAX_PROFILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+_local = threading.local()
+_active = {}  # thread (or greenlet) ident -> RequestProfile
+_lock = threading.Lock()
+_sampler = None
+
+
+def _native(module, name, default):
+    """The unpatched original when gevent has monkey-patched threading.
+
+    Under gevent workers threading.get_ident() is a greenlet id and threads
+    are greenlets, but sys._current_frames() is keyed by OS thread and a
+    greenlet sampler would only run while requests are blocked.
+    """
+    if "gevent" in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched("threading"):
+            return monkey.get_original(module, name)
+    return default
+
+
+def _current_greenlet():
+    if _native("_thread", "get_ident", None) is None:
+        return None
+    import gevent
+    return gevent.getcurrent()
+
+
+class RequestProfile:
+    def __init__(self, label, forced):
+        self.label = label
+        self.forced = forced
+        self.thread_id = threading.get_ident()
+        self.os_thread_id = _native("_thread", "get_ident", threading.get_ident)()
+        self.greenlet = _current_greenlet()
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.stacks = Counter()
+        self.queries = []
+
+    def log_query(self, sql, seconds):
+        self.queries.append({
+            "offset_ms": round((time.perf_counter() - self.start - seconds) * 1000, 2),
+            "duration_ms": round(seconds * 1000, 2),
+            "sql": " ".join(sql.split()),
+        })
+
+
+def start(label, forced=False):
+    """Begin profiling the current thread's request."""
+    profile = RequestProfile(label, forced)
+    _local.profile = profile
+    with _lock:
+        _active[profile.thread_id] = profile
+    _ensure_sampler()
+    return profile
+
+
+def current():
+    return getattr(_local, "profile", None)
+
+
+def finish(status=None):
+    """Stop profiling; write the profile if forced or over the threshold.
+
+    Returns the profile file stem, or None if nothing was stored.
+    """
+    profile = current()
+    if profile is None:
+        return None
+    _local.profile = None
+    with _lock:
+        _active.pop(profile.thread_id, None)
+    elapsed = time.perf_counter() - profile.start
+    if not profile.forced and elapsed < THRESHOLD:
+        return None
+    return _save(profile, elapsed, status)
+
+
+def list_profiles():
+    """Metadata of stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta["name"] = name[:-len(".json")]
+        meta["query_count"] = len(meta.pop("queries", []))
+        profiles.append(meta)
+    return profiles
+
+
+def _save(profile, elapsed, status):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    label = re.sub(r"[^A-Za-z0-9_.-]", "_", profile.label)
+    stem = f"{profile.started_at:%Y%m%dT%H%M%S%f}_{label}_{int(elapsed * 1000)}ms"
+    # Folded stacks: one "frame;frame;frame count" line per unique stack,
+    # readable by flamegraph.pl, speedscope and inferno.
+    with open(os.path.join(PROFILE_DIR, stem + ".folded"), "w") as f:
+        for stack, count in profile.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(os.path.join(PROFILE_DIR, stem + ".json"), "w") as f:
+        json.dump({
+            "endpoint": profile.label,
+            "started_at": profile.started_at.isoformat(),
+            "duration_ms": round(elapsed * 1000, 1),
+            "status": status,
+            "forced": profile.forced,
+            "samples": sum(profile.stacks.values()),
+            "sql_ms": round(sum(q["duration_ms"] for q in profile.queries), 1),
+            "queries": profile.queries,
+        }, f, indent=1)
+    _prune()
+    return stem
+
+
+def _prune():
+    stems = sorted({n.rsplit(".", 1)[0] for n in os.listdir(PROFILE_DIR)}, reverse=True)
+    for stem in stems[MAX_PROFILES:]:
+        for ext in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, stem + ext))
+            except OSError:
+                pass
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _frame(profile, frames):
+    greenlet = profile.greenlet
+    if greenlet is not None:
+        # A suspended greenlet keeps its own frame (where it waits); the
+        # running one owns its OS thread's current frame.
+        if greenlet.gr_frame is not None or greenlet.dead:
+            return greenlet.gr_frame
+    return frames.get(profile.os_thread_id)
+
+
+def _sample_loop():
+    sleep = _native("time", "sleep", time.sleep)
+    while True:
+        sleep(INTERVAL)
+        with _lock:
+            profiles = list(_active.values())
+        if not profiles:
+            continue
+        frames = sys._current_frames()
+        for profile in profiles:
+            frame = _frame(profile, frames)
+            if frame is not None:
+                profile.stacks[_fold(frame)] += 1
+
+
+def _ensure_sampler():
+    global _sampler
+    if _sampler is not None:
+        return
+    with _lock:
+        if _sampler is None:
+            start_new_thread = _native("_thread", "start_new_thread", None)
+            if start_new_thread is not None:
+                # A real OS thread, so sampling doesn't wait for the hub
+                _sampler = start_new_thread(_sample_loop, ())
+            else:
+                _sampler = threading.Thread(target=_sample_loop, name="profiler", daemon=True)
+                _sampler.start()
@@ -0,0 +1,119 @@
+"""Background purge of tombstoned users and dreams.
+
+    python purger.py            # drain the backlog once, printing progress
+    python purger.py --watch    # keep going, polling every PURGE_POLL_SECONDS
+
+Deleting in the app only sets deleted_at. The rows are removed here in
+batches of PURGE_BATCH_SIZE, one short transaction each, sleeping
+PURGE_PAUSE_MS plus the batch's own duration in between so the purger takes
+at most about half the database's time. In the web process wake() starts a
+daemon thread after each delete; on serverless, where threads are frozen
+between requests, run `python purger.py` from a cron job instead. Several
+purgers can run at once: batches skip rows another one has locked.
+"""
+import argparse
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import database as db
+from metrics import PURGED_ROWS
+
+BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))
+PAUSE = float(os.getenv("PURGE_PAUSE_MS", "200")) / 1000
+POLL = float(os.getenv("PURGE_POLL_SECONDS", "300"))
+REPORT_EVERY = 10.0  # seconds between progress lines
+
+_wake = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+_status = {
+    "running": False,
+    "backlog": None,
+    "purged": {},
+    "batches": 0,
+    "last_batch_at": None,
+    "last_error": None,
+}
+
+
+def drain(batch_size=BATCH_SIZE, pause=PAUSE, report=print):
+    """Purge until no tombstoned rows are left; returns rows deleted per table."""
+    backlog = db.get_purge_backlog()
+    _status["backlog"] = backlog
+    if not any(backlog.values()):
+        return {}
+    report(f"purge: starting, backlog {backlog}")
+    done = {}
+    last_report = time.monotonic()
+    _status["running"] = True
+    try:
+        while True:
+            start = time.monotonic()
+            table, rows = db.purge_batch(batch_size)
+            if not rows:
+                break
+            elapsed = time.monotonic() - start
+            done[table] = done.get(table, 0) + rows
+            PURGED_ROWS.labels(table).inc(rows)
+            _status["purged"][table] = _status["purged"].get(table, 0) + rows
+            _status["batches"] += 1
+            _status["last_batch_at"] = time.time()
+            if time.monotonic() - last_report >= REPORT_EVERY:
+                report("purge: " + ", ".join(
+                    f"{t} {done.get(t, 0)}/{n}" for t, n in backlog.items()))
+                last_report = time.monotonic()
+            time.sleep(pause + elapsed)
+    finally:
+        _status["running"] = False
+    _status["backlog"] = db.get_purge_backlog()
+    report(f"purge: done, deleted {done}")
+    return done
+
+
+def _loop():
+    while True:
+        _wake.clear()
+        try:
+            drain()
+        except Exception as e:
+            print("Purge error:", e)
+            _status["last_error"] = str(e)
+        _wake.wait(POLL)
+
+
+def wake():
+    """Start the in-process purger, or nudge it, after a delete."""
+    global _thread
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_loop, name="purger", daemon=True)
+            _thread.start()
+    _wake.set()
+
+
+def status():
+    return {**_status, "purged": dict(_status["purged"]),
+            "thread_alive": bool(_thread and _thread.is_alive())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Purge tombstoned users and dreams")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--pause-ms", type=float, default=PAUSE * 1000)
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running, checking every PURGE_POLL_SECONDS")
+    args = parser.parse_args()
+    while True:
+        drain(args.batch_size, args.pause_ms / 1000)
+        if not args.watch:
+            break
+        time.sleep(POLL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open."""
+
+
+class ConcurrencyLimitError(Exception):
+    """Raised when a call is rejected because the endpoint is at its limit."""
+
+
+class QueueFullError(Exception):
+    """Raised when a key already has its maximum number of calls queued or running."""
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a queued call is not dispatched within the scheduler's timeout."""
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker.
+
+    Opens when the error rate or slow-call rate over the last ``window``
+    seconds crosses its threshold, rejects calls for ``cooldown`` seconds,
+    then lets ``half_open_probes`` calls through to decide whether to close.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, error_rate=0.5, slow_rate=0.5, slow_call=10.0,
+                 min_calls=10, window=30.0, cooldown=15.0, half_open_probes=2):
+        self.name = name
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_call = slow_call
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+
+        self._lock = threading.Lock()
+        self._calls = deque()  # (timestamp, ok, latency)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def before_call(self):
+        """Reserve a slot for a call or raise CircuitOpenError."""
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            if self._state == self.OPEN:
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            if self._state == self.HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    raise CircuitOpenError(f"{self.name} circuit is half-open")
+                self._probes_in_flight += 1
+
+    def cancel(self):
+        """Give back a slot reserved by before_call() for a call never made."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record(self, ok, latency):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if not ok or latency >= self.slow_call:
+                    self._trip(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._state = self.CLOSED
+                    self._calls.clear()
+                return
+
+            self._calls.append((now, ok, latency))
+            self._evict(now)
+            if self._state == self.CLOSED and len(self._calls) >= self.min_calls:
+                total = len(self._calls)
+                errors = sum(1 for _, good, _ in self._calls if not good)
+                slow = sum(1 for _, _, lat in self._calls if lat >= self.slow_call)
+                if errors / total >= self.error_rate or slow / total >= self.slow_rate:
+                    self._trip(now)
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            self._evict(now)
+            total = len(self._calls)
+            errors = sum(1 for _, good, _ in self._calls if not good)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "calls": total,
+                "error_rate": round(errors / total, 3) if total else 0.0,
+                "retry_in": (round(max(0.0, self._opened_at + self.cooldown - now), 1)
+                             if self._state == self.OPEN else 0.0),
+            }
+
+    def _trip(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._calls.clear()
+
+    def _maybe_half_open(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+    def _evict(self, now):
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+
+class AIMDLimiter:
+    """Adaptive concurrency limit: additive increase, multiplicative decrease.
+
+    Each successful call that finishes under ``target_latency`` grows the
+    limit by roughly one per limit's worth of calls; a failure or slow call
+    multiplies it by ``backoff``. Calls beyond the limit are rejected
+    immediately rather than queued.
+    """
+
+    def __init__(self, name, initial=8, min_limit=1, max_limit=64,
+                 target_latency=5.0, backoff=0.7):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        with self._lock:
+            if self._in_flight >= int(self._limit):
+                raise ConcurrencyLimitError(
+                    f"{self.name} at concurrency limit ({int(self._limit)})"
+                )
+            self._in_flight += 1
+
+    def release(self, ok, latency):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            if ok and latency < self.target_latency:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+            else:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+
+    def snapshot(self):
+        with self._lock:
+            return {"name": self.name, "limit": int(self._limit),
+                    "in_flight": self._in_flight}
+
+
+class Hedger:
+    """Send a duplicate request when the first is slower than usual.
+
+    The hedge deadline is the ``percentile`` of recently observed latencies
+    (``default_deadline`` until ``min_samples`` have been seen). Hedges are
+    capped by ``budget``: each request earns that fraction of a hedge, so at
+    most ~``budget`` of traffic is duplicated. ``call(fn, admit)`` also asks
+    ``admit()`` before each hedge, so duplicates can be charged to a quota
+    and skipped when it is spent. Whichever attempt succeeds first wins; the
+    other is cancelled if it has not started yet and its result is otherwise
+    discarded.
+    """
+
+    def __init__(self, name, percentile=95.0, budget=0.05, default_deadline=5.0,
+                 min_samples=20, max_samples=500, max_workers=32):
+        self.name = name
+        self.percentile = percentile
+        self.budget = budget
+        self.default_deadline = default_deadline
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=max_samples)
+        self._tokens = 1.0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix=f"hedge-{name}")
+        self._counts = {"requests": 0, "hedges": 0, "not_admitted": 0,
+                        "primary_wins": 0, "hedge_wins": 0, "failures": 0}
+
+    def deadline(self):
+        with self._lock:
+            return self._deadline()
+
+    def call(self, fn, admit=None):
+        start = time.monotonic()
+        with self._lock:
+            self._counts["requests"] += 1
+            self._tokens = min(10.0, self._tokens + self.budget)
+            deadline = self._deadline()
+
+        pending = {self._pool.submit(fn): "primary"}
+        done, _ = wait(pending, timeout=deadline)
+        if not done and self._take_token(admit):
+            pending[self._pool.submit(fn)] = "hedge"
+
+        error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                label = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                self._observe(label, time.monotonic() - start)
+                return result
+        with self._lock:
+            self._counts["failures"] += 1
+        raise error
+
+    def snapshot(self):
+        with self._lock:
+            return {"name": self.name, "deadline": round(self._deadline(), 3),
+                    "samples": len(self._samples), **self._counts}
+
+    def _take_token(self, admit=None):
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            if admit is not None and not admit():
+                self._counts["not_admitted"] += 1
+                return False
+            self._tokens -= 1.0
+            self._counts["hedges"] += 1
+            return True
+
+    def _observe(self, label, latency):
+        with self._lock:
+            self._samples.append(latency)
+            self._counts[f"{label}_wins"] += 1
+
+    def _deadline(self):
+        if len(self._samples) < self.min_samples:
+            return self.default_deadline
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100.0))
+        return ordered[idx]
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``capacity``."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_take(self, n=1.0):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < n:
+                return False
+            self._tokens -= n
+            return True
+
+    def wait_time(self, n=1.0):
+        """Seconds until ``n`` tokens will be available."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (n - self._tokens) / self.rate) if self.rate else float("inf")
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class KeyedRateLimiter:
+    """One TokenBucket per key (IP, username, ...), capped at ``max_keys``.
+
+    State is per process, so under gunicorn each worker throttles on its own.
+    """
+
+    def __init__(self, rate, capacity, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        return bucket.try_take()
+
+
+class FairScheduler:
+    """Weighted fair queuing of calls per key, paced by a shared TokenBucket.
+
+    Each call waits in a queue until the bucket (sized to the provider's
+    quota: ``rate`` calls per second, ``burst`` at once) has ``cost`` tokens
+    for it. Among waiting calls, a lower ``tier`` always goes first; within a
+    tier, calls are ordered by self-clocked virtual finish time, so a key
+    with many queued calls only gets its ``weight`` share while others wait.
+    ``per_key`` caps calls queued or running per key.
+
+    State is per process, so it only shares anything between requests that
+    are in the same process at the same time: gunicorn's gevent worker (the
+    shipped config). A sync worker or a serverless instance handles one
+    request at a time, so its queue never holds a second caller and every
+    call is served first come, first served. Under gunicorn each worker
+    needs its share of the quota.
+    """
+
+    def __init__(self, name, rate, burst, per_key=4, timeout=30.0, tiers=("default",)):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.per_key = per_key
+        self.timeout = timeout
+        self.tiers = tuple(tiers)
+
+        self._cond = threading.Condition()
+        self._heap = []  # (tier, finish, seq, job)
+        self._seq = itertools.count()
+        self._vtime = [0.0] * len(self.tiers)
+        self._last_finish = {}  # (tier, key) -> finish tag of its newest queued call
+        self._queued = {}  # (tier, key) -> calls waiting
+        self._active = {}  # key -> calls queued or running
+        self._waits = [deque(maxlen=512) for _ in self.tiers]
+        self._counts = {"dispatched": 0, "rejected": 0, "timeouts": 0}
+
+    @contextmanager
+    def slot(self, key, tier=0, cost=1.0, weight=1.0):
+        """Block until it is ``key``'s turn, then run the body; yields the wait in seconds."""
+        if isinstance(tier, str):
+            tier = self.tiers.index(tier)
+        cost = min(float(cost), self.bucket.capacity)
+        with self._cond:
+            if self._active.get(key, 0) >= self.per_key:
+                self._counts["rejected"] += 1
+                raise QueueFullError(f"{self.name}: {key!r} has {self.per_key} calls pending")
+            self._active[key] = self._active.get(key, 0) + 1
+        try:
+            waited = self._wait_turn(key, tier, cost, weight)
+            yield waited
+        finally:
+            with self._cond:
+                self._active[key] -= 1
+                if not self._active[key]:
+                    del self._active[key]
+
+    def _wait_turn(self, key, tier, cost, weight):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        qkey = (tier, key)
+        with self._cond:
+            begin = max(self._vtime[tier], self._last_finish.get(qkey, 0.0))
+            finish = begin + cost / weight
+            self._last_finish[qkey] = finish
+            self._queued[qkey] = self._queued.get(qkey, 0) + 1
+            job = [tier, finish, next(self._seq), key]
+            heapq.heappush(self._heap, job)
+            try:
+                while True:
+                    head = self._heap[0] is job
+                    if head and self.bucket.try_take(cost):
+                        heapq.heappop(self._heap)
+                        self._vtime[tier] = finish
+                        waited = time.monotonic() - start
+                        self._waits[tier].append(waited)
+                        self._counts["dispatched"] += 1
+                        self._cond.notify_all()
+                        return waited
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._heap.remove(job)
+                        heapq.heapify(self._heap)
+                        self._counts["timeouts"] += 1
+                        self._cond.notify_all()
+                        raise QueueTimeoutError(f"{self.name}: waited {self.timeout:.0f}s for a turn")
+                    # Only the head has to watch the bucket refill; the rest
+                    # are woken when the head changes.
+                    self._cond.wait(min(remaining, self.bucket.wait_time(cost)) if head else remaining)
+            finally:
+                self._queued[qkey] -= 1
+                if not self._queued[qkey]:
+                    # Nothing left queued: a dispatched tag is <= the tier's
+                    # virtual time anyway, and a timed-out one was never
+                    # served, so it must neither linger nor delay the next call.
+                    del self._queued[qkey]
+                    self._last_finish.pop(qkey, None)
+
+    def snapshot(self):
+        with self._cond:
+            tiers = {}
+            for i, name in enumerate(self.tiers):
+                waits = sorted(self._waits[i])
+                tiers[name] = {
+                    "queued": sum(1 for job in self._heap if job[0] == i),
+                    "keys": sum(1 for t, _ in self._queued if t == i),
+                    "wait_p50": round(waits[len(waits) // 2], 3) if waits else 0.0,
+                    "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3)
+                                if waits else 0.0,
+                }
+            return {"name": self.name, "rate": self.bucket.rate,
+                    "burst": self.bucket.capacity, "tiers": tiers, **self._counts}
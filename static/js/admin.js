@@ -0,0 +1,35 @@
+let pendingForm = null;
+const modal      = document.getElementById('confirmModal');
+const modalTitle = document.getElementById('modalTitle');
+const modalMsg   = document.getElementById('modalMsg');
+const modalIcon  = document.getElementById('modalIcon');
+const confirmBtn = document.getElementById('modalConfirmBtn');
+
+const confirmCfg = {
+  'dream':       ['⚠️', 'DELETE DREAM?',       'This dream record will be permanently erased.', 'btn-danger'],
+  'block':       ['🚫', 'BLOCK USER?',          'User will be suspended and unable to log in.',   'btn-warn'],
+  'delete-user': ['💀', 'DELETE USER?',         'ALL user data and dreams will be permanently destroyed. This cannot be undone.', 'btn-danger'],
+  'promote':     ['🛡️', 'GRANT ADMIN ACCESS?',  'This user will gain full administrative privileges.', 'btn-blue'],
+  'demote':      ['⬇️', 'REVOKE ADMIN ACCESS?', 'Admin privileges will be removed from this user.', 'btn-warn'],
+};
+
+function confirmAction(e, type) {
+  e.preventDefault();
+  pendingForm = e.target.closest('form');
+  const [icon, title, msg, btnClass] = confirmCfg[type] || ['⚠️','CONFIRM?','This cannot be undone.','btn-danger'];
+  modalIcon.textContent  = icon;
+  modalTitle.textContent = title;
+  modalMsg.textContent   = msg;
+  confirmBtn.className   = 'btn ' + btnClass;
+  modal.classList.add('active');
+  return false;
+}
+function closeModal(){ modal.classList.remove('active'); pendingForm = null; }
+confirmBtn.addEventListener('click', () => { if(pendingForm) pendingForm.submit(); closeModal(); });
+modal.addEventListener('click', e => { if(e.target===modal) closeModal(); });
+
+function filterTable(id, q){
+  document.querySelectorAll('#'+id+' tbody tr').forEach(row=>{
+    row.style.display = row.textContent.toLowerCase().includes(q.toLowerCase()) ? '' : 'none';
+  });
+}
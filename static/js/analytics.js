@@ -0,0 +1,61 @@
+// ── Mood Calendar renderer ─────────────────────────────────────────────────
+(function() {
+  const moodMap = JSON.parse(document.getElementById('mood-map').textContent);
+  const emotionColors = {
+    joy:      '#6ee7b7', sadness: '#93c5fd', fear:    '#c4b5fd',
+    anger:    '#fca5a5', surprise:'#fde68a', disgust: '#d1d5db',
+    neutral:  '#6b7280', admiration:'#a5f3fc', amusement:'#fbcfe8',
+  };
+  const container = document.getElementById('moodCalendar');
+  if (!container) return;
+
+  const today = new Date();
+  const startDate = new Date(today);
+  startDate.setDate(today.getDate() - 89);
+
+  // Build week columns
+  const weeks = [];
+  let week = [];
+  let d = new Date(startDate);
+  // Pad first week
+  for (let i = 0; i < d.getDay(); i++) week.push(null);
+  while (d <= today) {
+    week.push(new Date(d));
+    if (d.getDay() === 6) { weeks.push(week); week = []; }
+    d.setDate(d.getDate() + 1);
+  }
+  if (week.length) { while(week.length < 7) week.push(null); weeks.push(week); }
+
+  const dayLabels = ['Su','Mo','Tu','We','Th','Fr','Sa'];
+  const CELL = 14, GAP = 3;
+
+  let html = `<div style="display:flex;gap:${GAP}px;align-items:flex-start;min-width:fit-content;">`;
+  // Day labels column
+  html += `<div style="display:flex;flex-direction:column;gap:${GAP}px;padding-top:20px;">`;
+  for (let i = 0; i < 7; i++) {
+    html += `<div style="width:18px;height:${CELL}px;font-size:9px;color:var(--muted);line-height:${CELL}px;text-align:right;">${i%2===1?dayLabels[i]:''}</div>`;
+  }
+  html += '</div>';
+
+  weeks.forEach((wk, wi) => {
+    html += `<div style="display:flex;flex-direction:column;gap:${GAP}px;">`;
+    // Month label on first day of month
+    const firstReal = wk.find(Boolean);
+    const showMonth = firstReal && (firstReal.getDate() <= 7 || wi === 0);
+    html += `<div style="height:16px;font-size:9px;color:var(--muted);white-space:nowrap;">${showMonth ? firstReal.toLocaleString('default',{month:'short'}) : ''}</div>`;
+    wk.forEach(day => {
+      if (!day) {
+        html += `<div style="width:${CELL}px;height:${CELL}px;"></div>`;
+        return;
+      }
+      const key = day.toISOString().slice(0,10);
+      const emo = moodMap[key];
+      const color = emo ? (emotionColors[emo] || '#a78bfa') : 'rgba(255,255,255,0.05)';
+      const title = emo ? `${key}: ${emo}` : key;
+      html += `<div title="${title}" style="width:${CELL}px;height:${CELL}px;border-radius:3px;background:${color};cursor:default;transition:transform 0.15s;" onmouseover="this.style.transform='scale(1.4)'" onmouseout="this.style.transform='scale(1)'"></div>`;
+    });
+    html += '</div>';
+  });
+  html += '</div>';
+  container.innerHTML = html;
+})();
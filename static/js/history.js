@@ -0,0 +1,10 @@
+function confirmDelete(id) {
+  document.getElementById('deleteForm').action = '/delete/' + id;
+  document.getElementById('deleteModal').classList.add('active');
+}
+function closeModal() {
+  document.getElementById('deleteModal').classList.remove('active');
+}
+document.getElementById('deleteModal').addEventListener('click', function(e) {
+  if (e.target === this) closeModal();
+});
@@ -0,0 +1,75 @@
+// ── Textarea char count ──────────────────────────────────────────────────
+const textarea = document.getElementById('dreamText');
+const charBadge = document.getElementById('charCountBadge');
+function updateCount(){ charBadge.textContent = textarea.value.length + '/1000'; }
+textarea.addEventListener('input', updateCount);
+updateCount();
+
+// ── Loading overlay ──────────────────────────────────────────────────────
+const overlay = document.getElementById('loadingOverlay');
+document.getElementById('dreamForm').addEventListener('submit', () => {
+  if (textarea.value.trim()) overlay.classList.add('active');
+});
+
+// ── Sleep star rating ────────────────────────────────────────────────────
+const sStars    = document.querySelectorAll('.s-star');
+const sleepInput = document.getElementById('sleepQualityInput');
+let selStar = 0;
+function paintStars(n){ sStars.forEach(s => s.classList.toggle('active', +s.dataset.val <= n)); }
+sStars.forEach(s => {
+  s.addEventListener('mouseenter', () => paintStars(+s.dataset.val));
+  s.addEventListener('mouseleave', () => paintStars(selStar));
+  s.addEventListener('click', () => {
+    selStar = +s.dataset.val === selStar ? 0 : +s.dataset.val;
+    sleepInput.value = selStar || '';
+    paintStars(selStar);
+  });
+});
+
+// ── Mic / Voice input (Web Speech API) ──────────────────────────────────
+const micBtn = document.getElementById('micBtn');
+let recognition = null;
+if ('SpeechRecognition' in window || 'webkitSpeechRecognition' in window) {
+  const SR = window.SpeechRecognition || window.webkitSpeechRecognition;
+  recognition = new SR();
+  recognition.lang = 'en-US';
+  recognition.interimResults = false;
+  recognition.onresult = e => {
+    textarea.value += (textarea.value ? ' ' : '') + e.results[0][0].transcript;
+    updateCount();
+  };
+  recognition.onend = () => micBtn.style.color = '';
+  micBtn.addEventListener('click', () => {
+    recognition.start();
+    micBtn.style.color = 'var(--accent2)';
+  });
+} else {
+  micBtn.title = 'Voice input not supported in this browser';
+  micBtn.style.opacity = '0.4';
+}
+
+// ── Dream Frequency bars ─────────────────────────────────────────────────
+const dreamDates = JSON.parse(document.getElementById('dream-dates').textContent);
+const freqContainer = document.getElementById('freqBars');
+const days = ['Mon','Tue','Wed','Thu','Fri','Sat','Sun'];
+// Build last-7-days map
+const today = new Date();
+for (let i = 6; i >= 0; i--) {
+  const d = new Date(today);
+  d.setDate(today.getDate() - i);
+  const key = d.toISOString().slice(0,10);
+  const hasDream = dreamDates.includes(key);
+  const dayName = days[d.getDay() === 0 ? 6 : d.getDay() - 1];
+  const heightPct = hasDream ? (30 + Math.floor(Math.random()*55)) : 12;
+  const bar = document.createElement('div');
+  bar.className = 'freq-bar' + (hasDream ? ' has-dream' : '');
+  bar.style.height = heightPct + '%';
+  bar.innerHTML = `<span class="freq-tip">${dayName}${hasDream ? ' ✦' : ''}</span>`;
+  freqContainer.appendChild(bar);
+}
+
+// ── Quick Log button scrolls to textarea ─────────────────────────────────
+document.querySelector('.quick-log-btn')?.addEventListener('click', () => {
+  textarea.scrollIntoView({behavior:'smooth', block:'center'});
+  textarea.focus();
+});
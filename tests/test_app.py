@@ -0,0 +1,129 @@
+"""Request-level behaviour of app.py that doesn't need a database."""
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client():
+    app_module.app.config["TESTING"] = True
+    return app_module.app.test_client()
+
+
+def test_rate_limit_keys_on_forwarded_client(client, monkeypatch):
+    keys = []
+    monkeypatch.setattr(app_module.ip_limiter, "allow", lambda key: keys.append(key) or True)
+    monkeypatch.setattr(app_module.db, "create_user", lambda username, password: True)
+    for ip in ("203.0.113.7", "198.51.100.9"):
+        client.post("/register", data={"username": "sleeper", "password": "pw"},
+                    headers={"X-Forwarded-For": ip}, environ_base={"REMOTE_ADDR": "10.0.0.1"})
+    assert keys == ["203.0.113.7", "198.51.100.9"]
+
+
+def test_only_the_trusted_hop_is_used(client, monkeypatch):
+    keys = []
+    monkeypatch.setattr(app_module.ip_limiter, "allow", lambda key: keys.append(key) or True)
+    monkeypatch.setattr(app_module.db, "create_user", lambda username, password: True)
+    # A client-supplied value in front of the proxy's own entry is ignored
+    client.post("/register", data={"username": "sleeper", "password": "pw"},
+                headers={"X-Forwarded-For": "1.1.1.1, 203.0.113.7"},
+                environ_base={"REMOTE_ADDR": "10.0.0.1"})
+    assert keys == ["203.0.113.7"]
+
+
+def test_login_required_costs_no_query(client, monkeypatch):
+    def lookup(user_id):
+        raise AssertionError("login_required must not hit the database")
+    monkeypatch.setattr(app_module.db, "get_user_by_id", lookup)
+    monkeypatch.setattr(app_module.db, "get_dreams", lambda user_id, limit=100: [])
+    monkeypatch.setattr(app_module.db, "get_streaks",
+                        lambda user_id: {"current": 0, "longest": 0})
+    with client.session_transaction() as sess:
+        sess.update(user_id=7, username="sleeper", timezone="UTC")
+    assert client.get("/history").status_code == 200
+
+
+def test_deleted_user_session_ends_on_next_write(client, monkeypatch):
+    class AI:
+        def analyze(self, text, user_id, tier):
+            return "interp", {"primary": "joy", "secondary": "fear",
+                              "confidence_primary": 0.9, "confidence_secondary": 0.1}, []
+    monkeypatch.setattr(app_module, "get_ai", lambda: AI())
+    monkeypatch.setattr(app_module.db, "save_dream", lambda **kwargs: None)
+    with client.session_transaction() as sess:
+        sess.update(user_id=7, username="gone", timezone="UTC")
+    r = client.post("/", data={"dream": "a dream"})
+    assert r.status_code == 302 and r.headers["Location"].endswith("/login")
+    with client.session_transaction() as sess:
+        assert "user_id" not in sess
+
+
+def test_insights_json_returns_every_statistic(client, monkeypatch):
+    import insights
+
+    monkeypatch.setattr(insights.db, "get_dreams_version", lambda user_id: 3)
+    monkeypatch.setattr(insights.db, "get_analytics_series", lambda user_id: (3, [
+        (20000, 4, "joy", 0.9), (20001, 2, "fear", 0.6),
+        (20003, 5, "joy", 0.8), (20004, None, "fear", 0.7),
+    ]))
+    insights._cache.clear()
+    with client.session_transaction() as sess:
+        sess.update(user_id=7, username="sleeper", timezone="UTC")
+    stats = client.get("/analytics/insights.json").get_json()
+    assert stats["total"] == 4 and stats["sleep_rated"] == 3
+    assert stats["weekday_matrix"]["emotions"] == ["fear", "joy"]
+    assert stats["emotion_confidence"] == {"fear": 0.65, "joy": 0.85}
+    assert stats["rolling_sleep"]["start_day"] == 20000
+    assert set(stats["sleep_by_emotion"]["joy"]) >= {"r", "r_low", "r_high"}
+
+
+@pytest.mark.parametrize("tz_name, known_to_postgres, status", [
+    ("Europe/Berlin", True, 200),
+    ("Not/AZone", True, 400),        # rejected by zoneinfo before the database
+    ("Europe/Kyiv", False, 400),     # valid here, unknown to an older server tzdata
+])
+def test_set_timezone_checks_postgres(client, monkeypatch, tz_name, known_to_postgres, status):
+    monkeypatch.setattr(app_module.db, "set_user_timezone",
+                        lambda user_id, name: known_to_postgres)
+    with client.session_transaction() as sess:
+        sess.update(user_id=7, username="sleeper", timezone="UTC")
+    r = client.post("/settings/timezone", json={"timezone": tz_name})
+    assert r.status_code == status
+    with client.session_transaction() as sess:
+        assert sess["timezone"] == (tz_name if status == 200 else "UTC")
+
+
+@pytest.mark.parametrize("body", [{"timezone": 5}, {"timezone": None}, {}, ["Europe/Berlin"],
+                                  "Europe/Berlin"])
+def test_set_timezone_rejects_malformed_body(client, monkeypatch, body):
+    monkeypatch.setattr(app_module.db, "set_user_timezone", lambda user_id, name: True)
+    with client.session_transaction() as sess:
+        sess.update(user_id=7, username="sleeper", timezone="UTC")
+    assert client.post("/settings/timezone", json=body).status_code == 400
+
+
+def test_metrics_off_without_token(client, monkeypatch):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_needs_the_token(client, monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer nope"}).status_code == 404
+    r = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert r.status_code == 200 and b"http_request_duration_seconds" in r.data
+
+
+@pytest.mark.parametrize("is_admin, public, expected", [
+    (False, False, False),
+    (True, False, True),
+    (False, True, True),
+])
+def test_server_timing_visibility(client, monkeypatch, is_admin, public, expected):
+    monkeypatch.setattr(app_module, "SERVER_TIMING_PUBLIC", public)
+    if is_admin:
+        with client.session_transaction() as sess:
+            sess["is_admin"] = True
+    r = client.get("/login")
+    assert ("Server-Timing" in r.headers) == expected
@@ -0,0 +1,60 @@
+"""Fingerprinted assets with and without a built static/dist/."""
+import gzip
+import os
+import re
+
+import pytest
+
+import app as app_module
+import assets
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def no_dist(monkeypatch, tmp_path):
+    monkeypatch.setattr(assets, "MANIFEST", str(tmp_path / "missing" / "manifest.json"))
+    monkeypatch.setattr(assets, "DIST_DIR", str(tmp_path / "missing"))
+    monkeypatch.setattr(assets, "_manifest", None)
+    monkeypatch.setattr(assets, "_memory", {})
+
+
+@pytest.fixture
+def built_dist(monkeypatch, tmp_path):
+    monkeypatch.setattr(assets, "DIST_DIR", str(tmp_path / "dist"))
+    monkeypatch.setattr(assets, "MANIFEST", str(tmp_path / "dist" / "manifest.json"))
+    monkeypatch.setattr(assets, "_memory", {})
+    os.makedirs(assets.DIST_DIR)
+    monkeypatch.setattr(assets, "_manifest", None)
+    assets.build()
+
+
+def _source(path):
+    with open(os.path.join(assets.STATIC_DIR, path), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("setup", ["no_dist", "built_dist"])
+def test_hashed_url_served_immutable(client, request, setup):
+    request.getfixturevalue(setup)
+    with app_module.app.test_request_context():
+        url = assets.asset_url("css/base.css")
+    assert re.fullmatch(r"/assets/css/base\.[0-9a-f]{12}\.css", url)
+
+    r = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["Cache-Control"] == assets.IMMUTABLE
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert r.mimetype == "text/css"
+    assert gzip.decompress(r.get_data()) == _source("css/base.css")
+
+    r = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in r.headers
+    assert r.get_data() == _source("css/base.css")
+
+
+def test_unknown_asset_is_404_without_dist(client, no_dist):
+    assert client.get("/assets/css/base.000000000000.css").status_code == 404
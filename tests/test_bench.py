@@ -0,0 +1,22 @@
+"""Regression check of bench/run.py, without running a benchmark."""
+import run
+
+RESULT = {"rps": 100.0, "p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 40.0}
+
+
+def test_within_tolerance_passes():
+    slower = dict(RESULT, rps=90.0, p99_ms=45.0)
+    assert run.compare({"1k/history": slower}, {"1k/history": RESULT}, 0.2) == []
+
+
+def test_regression_is_reported():
+    slower = dict(RESULT, p95_ms=30.0)
+    assert run.compare({"1k/history": slower}, {"1k/history": RESULT}, 0.2) == [
+        "1k/history: p95_ms 30.0 > baseline 20.0"]
+
+
+def test_missing_baseline_entry_fails():
+    regressions = run.compare({"1k/history": RESULT, "1k/submit": RESULT},
+                              {"1k/history": RESULT}, 0.2)
+    assert len(regressions) == 1 and regressions[0].startswith("1k/submit: no baseline")
+    assert run.compare({"1k/history": RESULT}, {}, 0.2)
@@ -0,0 +1,23 @@
+"""Cold-start regression bounds for the serverless entry point.
+
+The defaults leave headroom for slow CI machines; tighten them locally with
+COLDSTART_MAX_IMPORT_MS / COLDSTART_MAX_FIRST_REQUEST_MS.
+"""
+import os
+
+import coldstart
+
+MAX_IMPORT_MS = float(os.getenv("COLDSTART_MAX_IMPORT_MS", "1000"))
+MAX_FIRST_REQUEST_MS = float(os.getenv("COLDSTART_MAX_FIRST_REQUEST_MS", "300"))
+
+# Only imported by the routes that need them (see the note in app.py)
+DEFERRED = ("numpy", "requests", "ai_model", "oauth", "insights")
+
+
+def test_cold_start_within_bounds():
+    timings, modules = coldstart.profile("/login", runs=3)
+    assert timings["status"] == 200
+    assert timings["import_ms"] <= MAX_IMPORT_MS, timings
+    assert timings["first_request_ms"] <= MAX_FIRST_REQUEST_MS, timings
+    eager = [name for name in DEFERRED if name in modules]
+    assert not eager, f"imported at cold start: {eager}"
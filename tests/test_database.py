@@ -0,0 +1,89 @@
+"""Write helpers in database.py against a connection that records its SQL."""
+import pytest
+
+import database as db
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._row = None
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.conn.executed.append(sql)
+        self._row = self.conn.rows.pop(0) if "RETURNING" in sql else None
+
+    def fetchone(self):
+        return self._row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = list(rows)  # one result per RETURNING statement
+        self.executed = []
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    def install(*rows):
+        fake = FakeConn(rows)
+        monkeypatch.setattr(db, "get_conn", lambda: fake)
+        return fake
+    return install
+
+
+def _touches_symbols_or_version(executed):
+    return [sql for sql in executed if "dream_symbols" in sql or "dreams_version" in sql]
+
+
+def test_save_dream_for_deleted_user(conn):
+    fake = conn(None)  # the INSERT ... SELECT found no live user
+    assert db.save_dream(1, "text", "interp", "joy", "fear", 0.9, 0.1,
+                         symbols=["water"]) is None
+    assert _touches_symbols_or_version(fake.executed) == []
+
+
+def test_delete_dream_owned(conn):
+    fake = conn((7,))
+    assert db.delete_dream(7, user_id=1) is True
+    assert len(_touches_symbols_or_version(fake.executed)) == 2
+
+
+def test_delete_dream_of_another_user_leaves_symbols(conn):
+    fake = conn(None)  # the owner-scoped UPDATE matched nothing
+    assert db.delete_dream(7, user_id=2) is False
+    assert _touches_symbols_or_version(fake.executed) == []
+
+
+def test_update_dream_replaces_symbols(conn):
+    fake = conn((7,))
+    assert db.update_dream(7, 1, "text", "interp", "joy", "fear", 0.9, 0.1,
+                           symbols=["Water", "train"]) is True
+    inserts = [sql for sql in fake.executed if sql.startswith("INSERT INTO dream_symbols")]
+    assert len(inserts) == 2
+
+
+def test_update_dream_after_delete_leaves_symbols(conn):
+    fake = conn(None)  # tombstoned or purged while the AI was running
+    assert db.update_dream(7, 1, "text", "interp", "joy", "fear", 0.9, 0.1,
+                           symbols=["water"]) is False
+    assert _touches_symbols_or_version(fake.executed) == []
@@ -0,0 +1,51 @@
+"""Insights cache: versions come from the same snapshot as the rows."""
+import pytest
+
+import insights
+
+ROWS_V4 = [(20000, 4, "joy", 0.9)]
+ROWS_V5 = ROWS_V4 + [(20001, 1, "fear", 0.6)]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    insights._cache.clear()
+    yield
+    insights._cache.clear()
+
+
+def test_version_from_a_replica_ahead_is_not_cached_with_older_rows(monkeypatch):
+    # The version lookup hit a replica that has replayed the new dream, the
+    # series query one that hasn't
+    monkeypatch.setattr(insights.db, "get_dreams_version", lambda user_id: 5)
+    monkeypatch.setattr(insights.db, "get_analytics_series", lambda user_id: (4, ROWS_V4))
+    assert insights.get_insights(1)["total"] == 1
+    assert insights._cache[1][0] == 4
+
+    monkeypatch.setattr(insights.db, "get_analytics_series", lambda user_id: (5, ROWS_V5))
+    assert insights.get_insights(1)["total"] == 2
+    assert insights._cache[1][0] == 5
+
+
+def test_older_snapshot_does_not_replace_newer_entry(monkeypatch):
+    monkeypatch.setattr(insights.db, "get_dreams_version", lambda user_id: 5)
+    monkeypatch.setattr(insights.db, "get_analytics_series", lambda user_id: (5, ROWS_V5))
+    insights.get_insights(1)
+
+    monkeypatch.setattr(insights.db, "get_dreams_version", lambda user_id: 4)
+    monkeypatch.setattr(insights.db, "get_analytics_series", lambda user_id: (4, ROWS_V4))
+    assert insights.get_insights(1)["total"] == 1
+    assert insights._cache[1][0] == 5
+
+
+def test_cache_hit_skips_the_series(monkeypatch):
+    monkeypatch.setattr(insights.db, "get_dreams_version", lambda user_id: 5)
+    monkeypatch.setattr(insights.db, "get_analytics_series", lambda user_id: (5, ROWS_V5))
+    first = insights.get_insights(1)
+    monkeypatch.setattr(insights.db, "get_analytics_series", None)
+    assert insights.get_insights(1) is first
+
+
+def test_user_without_dreams():
+    stats = insights.compute(*insights.load_series([]))
+    assert stats["total"] == 0 and stats["trend"] is None
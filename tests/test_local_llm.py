@@ -0,0 +1,186 @@
+"""LocalLLM and DreamAI's local/HF ordering, with a stand-in for llama_cpp.Llama."""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import types
+
+import pytest
+
+import fake_hf
+import local_llm
+from conftest import ROOT
+
+
+class FakeLlama:
+    """Replies with whatever the test queued; raises if the queue holds an exception."""
+
+    replies = []
+    calls = 0
+
+    def __init__(self, model_path, **kwargs):
+        self.model_path = model_path
+
+    def create_chat_completion(self, messages, max_tokens, temperature):
+        FakeLlama.calls += 1
+        reply = FakeLlama.replies.pop(0) if FakeLlama.replies else "a local interpretation"
+        if isinstance(reply, Exception):
+            raise reply
+        return {"choices": [{"message": {"content": reply}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+
+
+@pytest.fixture
+def hf(monkeypatch):
+    fake = fake_hf.FakeHF(latency_ms=1, jitter_ms=0)
+    server, url = fake_hf.start_in_thread(fake)
+    monkeypatch.setenv("HF_ROUTER_URL", url)
+    monkeypatch.setenv("HF_TIMEOUT", "5")
+    monkeypatch.delenv("HF_HEDGE", raising=False)
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_ai(hf, monkeypatch, tmp_path):
+    model = tmp_path / "model.gguf"
+    model.write_bytes(b"")
+    monkeypatch.setattr(local_llm, "llama_cpp", types.SimpleNamespace(Llama=FakeLlama))
+    monkeypatch.setenv("LOCAL_LLM_MODEL", str(model))
+    FakeLlama.replies, FakeLlama.calls = [], 0
+
+    def make(mode):
+        from ai_model import DreamAI
+        monkeypatch.setenv("LOCAL_LLM_MODE", mode)
+        return DreamAI()
+    return make
+
+
+def _chat(ai):
+    return ai._chat([{"role": "user", "content": "a dream"}], max_tokens=20, temperature=0.5)
+
+
+# ── _chat ordering ───────────────────────────────────────────────────────────
+
+def test_primary_uses_local_model_only(make_ai, hf):
+    ai = make_ai("primary")
+    assert _chat(ai) == "a local interpretation"
+    assert (FakeLlama.calls, hf.requests) == (1, 0)
+    assert ai.local.stats()["completion_tokens"] == 5
+
+
+def test_primary_falls_back_to_hf(make_ai, hf):
+    ai = make_ai("primary")
+    FakeLlama.replies = [RuntimeError("llama.cpp failed")]
+    assert _chat(ai).startswith("Your dream speaks")
+    assert (FakeLlama.calls, hf.requests) == (1, 1)
+
+
+def test_fallback_prefers_hf(make_ai, hf):
+    ai = make_ai("fallback")
+    assert _chat(ai).startswith("Your dream speaks")
+    assert (FakeLlama.calls, hf.requests) == (0, 1)
+
+
+def test_fallback_uses_local_model_when_hf_fails(make_ai, hf):
+    ai = make_ai("fallback")
+    hf.error_rate = 1.0
+    assert _chat(ai) == "a local interpretation"
+    assert (FakeLlama.calls, hf.requests) == (1, 1)
+
+
+def test_off_without_local_model(make_ai, hf):
+    ai = make_ai("off")
+    assert ai.local is None
+    hf.error_rate = 1.0
+    with pytest.raises(Exception):
+        _chat(ai)
+
+
+def test_full_queue_is_busy():
+    llm = local_llm.LocalLLM("model.gguf", queue=0)
+    llm._slots.acquire()
+    with pytest.raises(local_llm.LocalLLMBusy):
+        llm.chat([])
+
+
+# ── interpret_and_extract ────────────────────────────────────────────────────
+
+def test_combined_reply_is_parsed(make_ai, hf):
+    ai = make_ai("primary")
+    FakeLlama.replies = ['Sure!\n```json\n{"interpretation": " Change is coming. ",'
+                         ' "symbols": ["Train", "", "Frozen Lake"]}\n```']
+    assert ai.interpret_and_extract("a dream") == ("Change is coming.", ["train", "frozen lake"])
+    assert FakeLlama.calls == 1
+
+
+def test_unparseable_reply_falls_back_to_separate_calls(make_ai, hf):
+    ai = make_ai("primary")
+    FakeLlama.replies = ["no json here", "separate interpretation", '["water"]']
+    assert ai.interpret_and_extract("a dream") == ("separate interpretation", ["water"])
+    assert FakeLlama.calls == 3
+
+
+# ── backfill.improved ────────────────────────────────────────────────────────
+
+def test_improved_keeps_only_real_parts():
+    from ai_model import FALLBACK_EMOTION, FALLBACK_INTERPRETATION
+    from backfill import improved
+
+    needs_all = {"needs_interpretation": True, "needs_emotion": True, "needs_symbols": True}
+    assert improved(needs_all, FALLBACK_INTERPRETATION, dict(FALLBACK_EMOTION), []) == {}
+    emotion = {"primary": "joy", "confidence_primary": 0.8}
+    assert improved(needs_all, "real", emotion, ["water"]) == {
+        "interpretation": "real", "emotion": emotion, "symbols": ["water"]}
+    only_symbols = dict(needs_all, needs_interpretation=False, needs_emotion=False)
+    assert improved(only_symbols, "real", emotion, ["water"]) == {"symbols": ["water"]}
+
+
+# ── gevent ───────────────────────────────────────────────────────────────────
+
+_CHILD = textwrap.dedent("""
+    from gevent import monkey
+    monkey.patch_all()
+    import json, time, types
+    import gevent
+    import local_llm
+
+    class Llama:
+        def __init__(self, **kwargs):
+            pass
+
+        def create_chat_completion(self, **kwargs):
+            end = time.perf_counter() + 0.3  # CPU-bound, like llama.cpp
+            while time.perf_counter() < end:
+                sum(range(1000))
+            return {"choices": [{"message": {"content": "done"}}]}
+
+    local_llm.llama_cpp = types.SimpleNamespace(Llama=Llama)
+    llm = local_llm.LocalLLM("model.gguf")
+    llm.warm()
+    ticks = []
+
+    def other_request():
+        for _ in range(20):
+            ticks.append(time.perf_counter())
+            gevent.sleep(0.01)
+
+    start = time.perf_counter()
+    job = gevent.spawn(llm.chat, [])
+    other = gevent.spawn(other_request)
+    gevent.joinall([job, other])
+    print(json.dumps({"reply": job.value,
+                      "ticks_during": sum(t < start + 0.25 for t in ticks)}))
+""")
+
+
+def test_generation_does_not_block_other_greenlets():
+    proc = subprocess.run([sys.executable, "-c", _CHILD], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60,
+                          env={"PATH": "", "PYTHONPATH": ROOT})
+    assert proc.returncode == 0, proc.stderr
+    result = json.loads(proc.stdout)
+    assert result["reply"] == "done"
+    assert result["ticks_during"] > 5
@@ -0,0 +1,258 @@
+"""oauth.py against a local fake provider that signs with a throwaway RSA key."""
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import oauth
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+# ── Throwaway RSA keys and RS256 signing ─────────────────────────────────────
+
+def _is_probable_prime(n, rounds=20):
+    if n < 2:
+        return False
+    for p in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29):
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for _ in range(rounds):
+        x = pow(random.randrange(2, n - 1), d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _prime(bits):
+    while True:
+        candidate = random.getrandbits(bits) | (1 << bits - 1) | 1
+        if _is_probable_prime(candidate):
+            return candidate
+
+
+class RSAKey:
+    def __init__(self, kid, bits=1024, e=65537):
+        while True:
+            p, q = _prime(bits // 2), _prime(bits // 2)
+            phi = (p - 1) * (q - 1)
+            if p != q and phi % e:
+                break
+        self.kid, self.n, self.e = kid, p * q, e
+        self.d = pow(e, -1, phi)
+
+    def jwk(self):
+        return {"kty": "RSA", "alg": "RS256", "use": "sig", "kid": self.kid,
+                "n": _b64(self.n.to_bytes((self.n.bit_length() + 7) // 8, "big")),
+                "e": _b64(self.e.to_bytes(3, "big"))}
+
+    def sign(self, data):
+        k = (self.n.bit_length() + 7) // 8
+        digest_info = oauth._SHA256_PREFIX + hashlib.sha256(data).digest()
+        em = b"\x00\x01" + b"\xff" * (k - len(digest_info) - 3) + b"\x00" + digest_info
+        return pow(int.from_bytes(em, "big"), self.d, self.n).to_bytes(k, "big")
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def id_token(key, **overrides):
+    claims = {"iss": "https://accounts.google.com", "aud": CLIENT_ID, "sub": "1234",
+              "email": "dreamer@example.com", "email_verified": True,
+              "name": "Dreamer", "iat": int(time.time()), "exp": int(time.time()) + 3600}
+    claims.update(overrides)
+    claims = {k: v for k, v in claims.items() if v is not None}
+    header = _b64(json.dumps({"alg": "RS256", "kid": key.kid, "typ": "JWT"}).encode())
+    payload = _b64(json.dumps(claims).encode())
+    signing_input = f"{header}.{payload}".encode()
+    return f"{header}.{payload}.{_b64(key.sign(signing_input))}"
+
+
+# ── Fake provider ────────────────────────────────────────────────────────────
+
+class FakeProvider:
+    """Google's token and JWKS endpoints plus GitHub's token and user API."""
+
+    def __init__(self, keys, api_delay=0.3):
+        self.keys = list(keys)
+        self.id_token = None
+        self.api_delay = api_delay
+        self.jwks_fetches = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.profile = {"id": 42, "login": "octodreamer", "email": None}
+        self.emails = [{"email": "old@example.com", "primary": False, "verified": True},
+                       {"email": "octo@example.com", "primary": True, "verified": True}]
+        self._lock = threading.Lock()
+
+    def respond(self, method, path):
+        if method == "GET" and path == "/certs":
+            self.jwks_fetches += 1
+            return 200, {"keys": [k.jwk() for k in self.keys]}
+        if method == "POST" and path == "/google/token":
+            return 200, {"id_token": self.id_token}
+        if method == "POST" and path == "/github/token":
+            return 200, {"access_token": "gho_test"}
+        if method == "GET" and path in ("/user", "/user/emails"):
+            with self._lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(self.api_delay)
+            with self._lock:
+                self.in_flight -= 1
+            return 200, self.profile if path == "/user" else self.emails
+        return 404, {"error": "not found"}
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    fake = FakeProvider([RSAKey("key-1")])
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, method):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            status, payload = fake.respond(method, self.path)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Cache-Control", "public, max-age=3600")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._reply("GET")
+
+        def do_POST(self):
+            self._reply("POST")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setenv("GOOGLE_CLIENT_ID", CLIENT_ID)
+    monkeypatch.setattr(oauth, "GOOGLE_TOKEN_URL", base + "/google/token")
+    monkeypatch.setattr(oauth, "_google_keys", oauth._JWKSCache(base + "/certs"))
+    monkeypatch.setattr(oauth, "GITHUB_TOKEN_URL", base + "/github/token")
+    monkeypatch.setattr(oauth, "GITHUB_API_URL", base)
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+def google_login(provider, token):
+    provider.id_token = token
+    return oauth.google_login("auth-code", "http://localhost/callback")
+
+
+# ── Google ID tokens ─────────────────────────────────────────────────────────
+
+def test_good_signature(provider):
+    token = id_token(provider.keys[0])
+    assert google_login(provider, token) == ("google:1234", "Dreamer", "dreamer@example.com")
+
+
+def test_tampered_payload(provider):
+    header, _, signature = id_token(provider.keys[0]).split(".")
+    forged = _b64(json.dumps({"iss": "https://accounts.google.com", "aud": CLIENT_ID,
+                              "sub": "1", "email": "admin@example.com",
+                              "email_verified": True,
+                              "exp": int(time.time()) + 3600}).encode())
+    with pytest.raises(oauth.OAuthError, match="signature"):
+        google_login(provider, f"{header}.{forged}.{signature}")
+
+
+def test_signed_by_another_key(provider):
+    stranger = RSAKey(provider.keys[0].kid)
+    with pytest.raises(oauth.OAuthError, match="signature"):
+        google_login(provider, id_token(stranger))
+
+
+@pytest.mark.parametrize("claims, message", [
+    ({"aud": "someone-else.apps.googleusercontent.com"}, "another client"),
+    ({"iss": "https://evil.example.com"}, "issuer"),
+    ({"exp": int(time.time()) - 3600}, "expired"),
+])
+def test_rejected_claims(provider, claims, message):
+    with pytest.raises(oauth.OAuthError, match=message):
+        google_login(provider, id_token(provider.keys[0], **claims))
+
+
+def test_expiry_leeway(provider):
+    token = id_token(provider.keys[0], exp=int(time.time()) - 30)
+    assert google_login(provider, token)[0] == "google:1234"
+
+
+@pytest.mark.parametrize("verified", [None, False, "false"])
+def test_unverified_email_is_dropped(provider, verified):
+    token = id_token(provider.keys[0], email_verified=verified)
+    assert google_login(provider, token) == ("google:1234", "Dreamer", "")
+
+
+def test_unknown_kid_then_rotation(provider):
+    assert google_login(provider, id_token(provider.keys[0]))[0] == "google:1234"
+    assert provider.jwks_fetches == 1
+
+    rotated = RSAKey("key-2")
+    provider.keys.append(rotated)
+    # Seen the key set less than a minute ago: no refetch for an unknown kid
+    with pytest.raises(oauth.OAuthError, match="Unknown"):
+        google_login(provider, id_token(rotated))
+    assert provider.jwks_fetches == 1
+
+    oauth._google_keys._fetched -= 61
+    assert google_login(provider, id_token(rotated))[0] == "google:1234"
+    assert provider.jwks_fetches == 2
+    # Both keys are now cached
+    assert google_login(provider, id_token(provider.keys[0]))[0] == "google:1234"
+    assert provider.jwks_fetches == 2
+
+
+def test_unknown_kid_not_in_rotation(provider):
+    oauth._google_keys._fetched -= 61
+    with pytest.raises(oauth.OAuthError, match="Unknown"):
+        google_login(provider, id_token(RSAKey("key-9")))
+
+
+def test_malformed_token(provider):
+    with pytest.raises(oauth.OAuthError, match="Malformed"):
+        google_login(provider, "not-a-jwt")
+
+
+# ── GitHub ───────────────────────────────────────────────────────────────────
+
+def test_github_fetches_profile_and_emails_concurrently(provider):
+    start = time.perf_counter()
+    result = oauth.github_login("auth-code", "http://localhost/callback")
+    elapsed = time.perf_counter() - start
+    assert result == ("github:42", "octodreamer", "octo@example.com")
+    assert provider.max_in_flight == 2
+    assert elapsed < 2 * provider.api_delay
+
+
+def test_github_skips_unverified_primary(provider):
+    provider.emails = [{"email": "octo@example.com", "primary": True, "verified": False}]
+    assert oauth.github_login("auth-code", "http://localhost/callback")[2] == ""
+
+
+def test_github_public_email_wins(provider):
+    provider.profile = dict(provider.profile, email="public@example.com")
+    assert oauth.github_login("auth-code", "http://localhost/callback")[2] == "public@example.com"
@@ -0,0 +1,59 @@
+"""Bounded password-hash pool and hash upgrades."""
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import passwords
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    monkeypatch.setattr(passwords, "_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(passwords, "HASH_TIMEOUT", 0.1)
+    return passwords._slots
+
+
+def test_timeout_is_busy_and_keeps_its_slot(one_slot):
+    release = threading.Event()
+    finished = threading.Event()
+
+    def slow_hash():
+        release.wait(5)
+        finished.set()
+
+    with pytest.raises(passwords.HashPoolBusy, match="took over"):
+        passwords._run(slow_hash)
+    # Still hashing: the slot must not be handed to anyone else yet
+    with pytest.raises(passwords.HashPoolBusy, match="saturated"):
+        passwords._run(lambda: None)
+    release.set()
+    finished.wait(5)
+    for _ in range(50):
+        if one_slot.acquire(timeout=0.1):
+            one_slot.release()
+            break
+    else:
+        pytest.fail("slot was not released after the hash finished")
+    assert passwords._run(lambda: "ok") == "ok"
+
+
+def test_errors_release_the_slot(one_slot):
+    def broken():
+        raise ValueError("bad hash")
+
+    with pytest.raises(ValueError):
+        passwords._run(broken)
+    assert passwords._run(lambda: "ok") == "ok"
+
+
+@pytest.mark.parametrize("method", ["scrypt", "pbkdf2", "pbkdf2:sha256:600000"])
+def test_short_method_names_do_not_force_rehash(monkeypatch, method):
+    monkeypatch.setattr(passwords, "HASH_METHOD", method)
+    passwords._method_prefix.cache_clear()
+    try:
+        assert not passwords.needs_rehash(generate_password_hash("pw", method))
+        assert passwords.needs_rehash(generate_password_hash("pw", "pbkdf2:sha256:1000"))
+        assert not passwords.needs_rehash("")
+    finally:
+        passwords._method_prefix.cache_clear()
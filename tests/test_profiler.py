@@ -0,0 +1,59 @@
+"""Stack sampling with plain threads and under gevent's monkey-patching."""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = textwrap.dedent("""
+    import json, sys
+    if sys.argv[1] == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+    import threading, time
+    import profiler
+    profiler.INTERVAL = 0.002
+
+    def spin(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            sum(range(1000))
+
+    results = []
+
+    def request(i):
+        p = profiler.start(f"req{i}")
+        spin(0.05)
+        time.sleep(0.05)  # yields to the other requests under gevent
+        spin(0.05)
+        profiler.finish(200)
+        results.append({"samples": sum(p.stacks.values()),
+                        "spin": any("spin" in s for s in p.stacks)})
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(json.dumps(results))
+""")
+
+
+def _profile(mode, tmp_path):
+    proc = subprocess.run([sys.executable, "-c", _CHILD, mode], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60,
+                          env={"PATH": "", "PYTHONPATH": ROOT, "PROFILE_DIR": str(tmp_path)})
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout)
+
+
+def test_samples_threads(tmp_path):
+    for result in _profile("threads", tmp_path):
+        assert result["samples"] > 10 and result["spin"]
+
+
+def test_samples_greenlets(tmp_path):
+    for result in _profile("gevent", tmp_path):
+        assert result["samples"] > 10 and result["spin"]
@@ -0,0 +1,406 @@
+"""Resilience primitives, alone and in front of the fake HF router."""
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import fake_hf
+from resilience import (AIMDLimiter, CircuitBreaker, CircuitOpenError, ConcurrencyLimitError,
+                        FairScheduler, Hedger, QueueFullError, QueueTimeoutError)
+
+
+# ── CircuitBreaker ───────────────────────────────────────────────────────────
+
+def test_breaker_opens_on_error_rate():
+    breaker = CircuitBreaker("t", error_rate=0.5, min_calls=4)
+    for ok in (True, False, True):
+        breaker.before_call()
+        breaker.record(ok, 0.01)
+    assert breaker.state == CircuitBreaker.CLOSED  # below min_calls
+    breaker.before_call()
+    breaker.record(False, 0.01)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_stays_closed_under_threshold():
+    breaker = CircuitBreaker("t", error_rate=0.5, min_calls=4)
+    for ok in (True, True, True, False, True, True):
+        breaker.before_call()
+        breaker.record(ok, 0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_on_slow_call_rate():
+    breaker = CircuitBreaker("t", slow_rate=0.5, slow_call=1.0, min_calls=4)
+    for latency in (0.1, 2.0, 0.1, 2.0):
+        breaker.before_call()
+        breaker.record(True, latency)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_forgets_calls_outside_window():
+    breaker = CircuitBreaker("t", min_calls=2, window=0.1)
+    breaker.record(False, 0.01)
+    time.sleep(0.15)
+    breaker.record(True, 0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["calls"] == 1
+
+
+def _open(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.record(False, 0.01)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_limits_probes_then_closes():
+    breaker = CircuitBreaker("t", min_calls=2, cooldown=0.1, half_open_probes=2)
+    _open(breaker)
+    time.sleep(0.15)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError, match="half-open"):
+        breaker.before_call()
+    breaker.record(True, 0.01)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record(True, 0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("t", min_calls=2, cooldown=0.1, half_open_probes=2)
+    _open(breaker)
+    time.sleep(0.15)
+    breaker.before_call()
+    breaker.record(False, 0.01)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()["retry_in"] > 0
+
+
+def test_cancelled_probe_frees_its_slot():
+    breaker = CircuitBreaker("t", min_calls=2, cooldown=0.1, half_open_probes=1)
+    _open(breaker)
+    time.sleep(0.15)
+    breaker.before_call()
+    breaker.cancel()
+    breaker.before_call()
+
+
+# ── AIMDLimiter ──────────────────────────────────────────────────────────────
+
+def test_limiter_rejects_beyond_limit():
+    limiter = AIMDLimiter("t", initial=2)
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(ConcurrencyLimitError):
+        limiter.acquire()
+    limiter.release(True, 0.01)
+    limiter.acquire()
+
+
+def test_limiter_shrinks_on_failure_and_slow_calls():
+    limiter = AIMDLimiter("t", initial=10, min_limit=2, target_latency=1.0, backoff=0.5)
+    limiter.acquire()
+    limiter.release(False, 0.01)
+    assert limiter.limit == 5
+    limiter.acquire()
+    limiter.release(True, 5.0)
+    assert limiter.limit == 2
+    limiter.acquire()
+    limiter.release(False, 0.01)
+    assert limiter.limit == 2  # floor
+
+
+def test_limiter_grows_by_about_one_per_window():
+    limiter = AIMDLimiter("t", initial=4, max_limit=6, target_latency=1.0)
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(True, 0.01)
+    assert limiter.limit == 5
+    for _ in range(50):
+        limiter.acquire()
+        limiter.release(True, 0.01)
+    assert limiter.limit == 6  # ceiling
+
+
+# ── Hedger ───────────────────────────────────────────────────────────────────
+
+class Attempts:
+    """fn for Hedger.call: attempt n sleeps delays[n] and then returns n or raises."""
+
+    def __init__(self, *delays, error=None):
+        self.delays = list(delays)
+        self.error = error
+        self.started = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            n = self.started
+            self.started += 1
+        time.sleep(self.delays[min(n, len(self.delays) - 1)])
+        if self.error is not None:
+            raise self.error
+        return n
+
+
+def test_hedges_stay_within_budget():
+    hedger = Hedger("t", budget=0.5, default_deadline=0.01, min_samples=1000)
+    hedged = []
+    for _ in range(6):
+        fn = Attempts(0.05)
+        hedger.call(fn)
+        hedged.append(fn.started == 2)
+    # One token to start with, half a token per request after that
+    assert hedged == [True, True, False, True, False, True]
+    assert hedger.snapshot()["hedges"] == 4
+
+
+def test_faster_hedge_wins():
+    hedger = Hedger("t", default_deadline=0.02, min_samples=1000)
+    assert hedger.call(Attempts(0.5, 0.01)) == 1
+    assert hedger.snapshot()["hedge_wins"] == 1
+
+
+def test_loser_that_has_not_started_is_cancelled(monkeypatch):
+    class Pool:
+        """Runs the primary; leaves the hedge queued, as a saturated pool would."""
+        def __init__(self):
+            self.futures = []
+
+        def submit(self, fn):
+            future = Future()
+            if not self.futures:
+                threading.Thread(target=lambda: future.set_result(fn())).start()
+            self.futures.append(future)
+            return future
+
+    hedger = Hedger("t", default_deadline=0.01, min_samples=1000)
+    pool = Pool()
+    monkeypatch.setattr(hedger, "_pool", pool)
+    assert hedger.call(Attempts(0.05)) == 0
+    primary, hedge = pool.futures
+    assert hedge.cancelled()
+    snap = hedger.snapshot()
+    assert (snap["hedges"], snap["primary_wins"]) == (1, 1)
+
+
+def test_errors_propagate_once_every_attempt_failed():
+    hedger = Hedger("t", default_deadline=0.01, min_samples=1000)
+    fn = Attempts(0.03, error=ValueError("router down"))
+    with pytest.raises(ValueError, match="router down"):
+        hedger.call(fn)
+    assert fn.started == 2
+    assert hedger.snapshot()["failures"] == 1
+
+
+def test_a_failed_attempt_loses_to_a_late_success():
+    hedger = Hedger("t", default_deadline=0.01, min_samples=1000)
+    fn = Attempts(0.1, 0.02)
+
+    def flaky():
+        if fn() == 1:
+            raise ValueError("hedge failed")
+        return "primary"
+    assert hedger.call(flaky) == "primary"
+
+
+def test_hedge_needs_admission():
+    hedger = Hedger("t", default_deadline=0.01, min_samples=1000)
+    fn = Attempts(0.05)
+    assert hedger.call(fn, admit=lambda: False) == 0
+    assert fn.started == 1
+    snap = hedger.snapshot()
+    assert (snap["hedges"], snap["not_admitted"]) == (0, 1)
+    # The refused hedge didn't spend the budget
+    fn = Attempts(0.05)
+    hedger.call(fn, admit=lambda: True)
+    assert fn.started == 2
+
+
+# ── FairScheduler ────────────────────────────────────────────────────────────
+
+def _drain(scheduler):
+    while scheduler.bucket.try_take():
+        pass
+
+
+def _until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the scheduler"
+        time.sleep(0.005)
+
+
+def _queue(scheduler, calls, order):
+    """Start one thread per (key, tier) call, each waiting for its turn in order."""
+    def call(key, tier):
+        with scheduler.slot(key, tier=tier):
+            order.append(key)
+    threads = []
+    for key, tier in calls:
+        before = len(scheduler._heap)
+        t = threading.Thread(target=call, args=(key, tier))
+        t.start()
+        _until(lambda: len(scheduler._heap) > before)
+        threads.append(t)
+    return threads
+
+
+def test_lower_tier_goes_first():
+    scheduler = FairScheduler("t", rate=20, burst=1, tiers=("submit", "reanalyze"))
+    _drain(scheduler)
+    order = []
+    threads = _queue(scheduler, [("backfill", "reanalyze"), ("backfill", "reanalyze"),
+                                 ("alice", "submit")], order)
+    for t in threads:
+        t.join()
+    assert order == ["alice", "backfill", "backfill"]
+
+
+def test_per_key_cap_rejects_only_that_key():
+    scheduler = FairScheduler("t", rate=100, burst=10, per_key=2)
+    release = threading.Event()
+
+    def hold():
+        with scheduler.slot("alice"):
+            release.wait()
+    threads = [threading.Thread(target=hold) for _ in range(2)]
+    for t in threads:
+        t.start()
+    _until(lambda: scheduler._active.get("alice") == 2)
+    with pytest.raises(QueueFullError):
+        with scheduler.slot("alice"):
+            pass
+    with scheduler.slot("bob"):
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert scheduler.snapshot()["rejected"] == 1
+    assert scheduler._active == {}
+
+
+def test_timeout_leaves_no_state_behind():
+    scheduler = FairScheduler("t", rate=0.01, burst=1, timeout=0.1)
+    _drain(scheduler)
+    for _ in range(2):
+        with pytest.raises(QueueTimeoutError):
+            with scheduler.slot("alice"):
+                pass
+    assert scheduler._queued == {}
+    assert scheduler._last_finish == {}
+    assert scheduler._heap == [] and scheduler._active == {}
+    assert scheduler.snapshot()["timeouts"] == 2
+
+
+def test_busy_key_does_not_starve_the_others():
+    scheduler = FairScheduler("t", rate=50, burst=1, per_key=10)
+    _drain(scheduler)
+    order = []
+    threads = _queue(scheduler, [("heavy", 0)] * 6 + [("light", 0)], order)
+    for t in threads:
+        t.join()
+    # Queued behind six calls, but served after at most the first of them
+    assert order.index("light") <= 1
+    assert order.count("heavy") == 6
+
+
+# ── DreamAI._post against the fake router ────────────────────────────────────
+
+@pytest.fixture
+def hf(monkeypatch):
+    fake = fake_hf.FakeHF(latency_ms=5, jitter_ms=0)
+    server, url = fake_hf.start_in_thread(fake)
+    monkeypatch.setenv("HF_ROUTER_URL", url)
+    monkeypatch.setenv("HF_TIMEOUT", "5")
+    monkeypatch.delenv("HF_HEDGE", raising=False)
+    monkeypatch.setenv("LOCAL_LLM_MODE", "off")
+    # Room for the half-open probes after an outage has shrunk the limit
+    monkeypatch.setenv("HF_CONCURRENCY_INITIAL", "64")
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def ai(hf):
+    from ai_model import DreamAI
+
+    ai = DreamAI()
+    # Small thresholds so the tests don't have to wait out production timings
+    for url, breaker in list(ai.breakers.items()):
+        ai.breakers[url] = CircuitBreaker(breaker.name, min_calls=4, slow_call=0.2,
+                                          cooldown=0.3, half_open_probes=2)
+    return ai
+
+
+def test_injected_failures_open_the_breaker_and_fail_fast(ai, hf):
+    from ai_model import FALLBACK_INTERPRETATION
+
+    hf.error_rate = 1.0
+    for _ in range(4):
+        assert ai.interpret("a dream") == FALLBACK_INTERPRETATION
+    assert hf.requests == 4
+    assert ai.breakers[ai.HF_CHAT_URL].state == CircuitBreaker.OPEN
+
+    start = time.monotonic()
+    assert ai.interpret("a dream") == FALLBACK_INTERPRETATION
+    assert ai.analyze_emotion("a dream")["primary"]  # other endpoint still called
+    assert time.monotonic() - start < 0.2
+    assert hf.requests == 5  # only the classifier call reached the router
+
+    with pytest.raises(CircuitOpenError):
+        ai._post(ai.HF_CHAT_URL, {})
+
+
+def test_slow_calls_open_the_breaker(ai, hf):
+    hf.latency_ms = 300
+    for _ in range(4):
+        ai._post(ai.HF_CHAT_URL, {"messages": [{"content": ""}]})
+    assert ai.breakers[ai.HF_CHAT_URL].state == CircuitBreaker.OPEN
+
+
+def test_half_open_lets_limited_probes_through_then_closes(ai, hf):
+    from ai_model import FALLBACK_INTERPRETATION
+
+    hf.error_rate = 1.0
+    for _ in range(4):
+        ai.interpret("a dream")
+    hf.error_rate = 0.0
+    hf.latency_ms = 100
+    time.sleep(0.35)
+
+    before = hf.requests
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(ai.interpret("a dream")))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert hf.requests - before == 2
+    assert results.count(FALLBACK_INTERPRETATION) == 3
+    assert ai.breakers[ai.HF_CHAT_URL].state == CircuitBreaker.CLOSED
+    assert ai.interpret("a dream") != FALLBACK_INTERPRETATION
+
+
+def test_limiter_tracks_router_health(ai, hf):
+    ai.breakers[ai.HF_CLASS_URL] = CircuitBreaker("classify", min_calls=100)
+    limiter = ai.limiters[ai.HF_CLASS_URL]
+    start = limiter.limit
+    hf.error_rate = 1.0
+    for _ in range(3):
+        ai.analyze_emotion("a dream")
+    shrunk = limiter.limit
+    assert shrunk < start
+    hf.error_rate = 0.0
+    for _ in range(3 * shrunk):
+        ai.analyze_emotion("a dream")
+    assert limiter.limit > shrunk
+    assert limiter.in_flight == 0